@@ -0,0 +1,98 @@
+import time
+from threading import Lock
+from monitor import state
+from horario import horario
+
+class LimitadorAnchoBanda:
+    """
+    Token bucket global compartido por todas las descargas del proceso.
+    La tasa se lee de state.dynamic_config en cada reserva, así que un cambio
+    desde /api/settings/limit se aplica en el siguiente chunk. Además cada
+    archivo activo tiene un reparto justo para que una parte rápida no se
+    lleve todo el cupo. El reparto es max-min: lo que no gasta un archivo
+    lento (servidor lento, sin leer) vuelve a los que piden más, así que el
+    total sigue llegando a la tasa aunque alguno no gaste su parte.
+    """
+    RAFAGA_SEGUNDOS = 1.0  # Crédito máximo acumulable (en segundos de tasa)
+    VENTANA_SEGUNDOS = 2.0  # Ventana para medir lo que consume cada archivo
+
+    def __init__(self):
+        self._lock = Lock()
+        self._siguiente_global = 0.0
+        self._archivos = {}
+
+    def registrar(self, clave):
+        with self._lock:
+            ahora = time.monotonic()
+            self._archivos[clave] = {"siguiente": 0.0, "bytes": 0, "desde": ahora, "ultimo": ahora, "medida": 0.0}
+
+    def liberar(self, clave):
+        with self._lock:
+            self._archivos.pop(clave, None)
+
+    def tasa_bytes(self):
+        """Límite vigente en bytes/s (0 = sin límite)."""
+        cfg = state.dynamic_config
+        if not cfg.get("limit_enabled"):
+            return 0
+        regla = horario.regla_actual()
+        if regla is None:
+            return 0
+        # La regla puede fijar su propio tope; si no, manda el valor del dashboard
+        limite_mb = regla["limite_mb"] if regla["limite_mb"] is not None else cfg.get("limit_value", 0)
+        if limite_mb <= 0:
+            return 0
+        return limite_mb * 1024 * 1024
+
+    def _medir(self, archivo, n_bytes, ahora):
+        archivo["bytes"] += n_bytes
+        archivo["ultimo"] = ahora
+        if ahora - archivo["desde"] >= self.VENTANA_SEGUNDOS:
+            archivo["medida"] = archivo["bytes"] / (ahora - archivo["desde"])
+            archivo["bytes"] = 0
+            archivo["desde"] = ahora
+
+    def _reparto(self, clave, tasa, ahora):
+        """
+        Parte de la tasa que le toca a clave: los demás archivos que gastan
+        menos que un reparto a partes iguales se quedan con lo que gastan y
+        el resto se divide entre clave y los que piden más. Los que no han
+        leído nada en la última ventana no cuentan.
+        """
+        otros = sorted(a["medida"] for c, a in self._archivos.items()
+                       if c != clave and ahora - a["ultimo"] < self.VENTANA_SEGUNDOS)
+        restante, n = tasa, len(otros) + 1
+        for consumo in otros:
+            if consumo >= restante / n: break
+            restante -= consumo
+            n -= 1
+        return restante / n
+
+    def reservar(self, clave, n_bytes):
+        """
+        Descuenta n_bytes del cubo y devuelve los segundos que el llamador debe
+        esperar antes de seguir leyendo (sleep o asyncio.sleep según el motor).
+        """
+        tasa = self.tasa_bytes()
+        if tasa <= 0: return 0
+
+        with self._lock:
+            ahora = time.monotonic()
+            rafaga = self.RAFAGA_SEGUNDOS
+
+            # Cubo global
+            inicio_global = max(self._siguiente_global, ahora - rafaga)
+            self._siguiente_global = inicio_global + n_bytes / tasa
+
+            # Reparto justo por archivo
+            archivo = self._archivos.get(clave)
+            if archivo is None:
+                return max(0.0, inicio_global - ahora)
+            tasa_archivo = self._reparto(clave, tasa, ahora)
+            self._medir(archivo, n_bytes, ahora)
+            inicio_archivo = max(archivo["siguiente"], ahora - rafaga)
+            archivo["siguiente"] = inicio_archivo + n_bytes / tasa_archivo
+
+            return max(0.0, inicio_global - ahora, inicio_archivo - ahora)
+
+limitador = LimitadorAnchoBanda()
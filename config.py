@@ -40,6 +40,8 @@ DEBRID_PRIORIDAD = os.getenv("DEBRID_PRIORIDAD", "RD")
 
 # --- AJUSTES DE EXTRACCIÓN ---
 RAR_PASSWORD = os.getenv("RAR_PASSWORD", "descargasdd")
+# Extraer los volúmenes .partN.rar a medida que terminan de descargarse
+UNRAR_STREAMING = os.getenv("UNRAR_STREAMING", "true").lower() in ["true", "1", "yes", "si", "on"]
 
 # --- BASE DE DATOS (CONFIGURACIÓN CORREGIDA) ---
 # Aquí ponemos 'PGroonga17' como valor por defecto si no se pasa la variable de entorno
@@ -58,10 +60,55 @@ DB_CONFIG = {
     "port": DB_PORT
 }
 
+# Pool de conexiones
+DB_POOL_MAX = int(os.getenv("POSTGRES_POOL_SIZE", "10"))
+DB_POOL_PING_SEGUNDOS = int(os.getenv("POSTGRES_POOL_PING_SECONDS", "60"))
+
+# Fallos seguidos (al resolver o descargar) tras los que un enlace se da por muerto
+ENLACE_MAX_FALLOS = int(os.getenv("LINK_MAX_FAILURES", "3"))
+# Cada cuánto se relee un hilo con todos sus enlaces muertos buscando una resubida
+ENLACE_REVISAR_MUERTOS_HORAS = int(os.getenv("DEAD_LINK_RECHECK_HOURS", "24"))
+
 # Configuración del Bot
 FOROS_PROCESAR = ["250", "142", "143", "164"]
 IDS_IGNORADOS = [""] 
 
+# Scraping concurrente: pestañas del mismo contexto y ritmo global de peticiones al foro
+SCRAPER_PAGINAS = max(1, int(os.getenv("SCRAPER_PAGES", "4")))
+SCRAPER_INTERVALO_MIN = float(os.getenv("SCRAPER_MIN_INTERVAL", "2.0"))
+SCRAPER_INTERVALO_MAX = float(os.getenv("SCRAPER_MAX_INTERVAL", "4.0"))
+# Hilos leídos que se guardan juntos en la DB (lo que antes llegue de los dos)
+SCRAPER_LOTE_HILOS = max(1, int(os.getenv("SCRAPER_SAVE_BATCH", "10")))
+SCRAPER_LOTE_SEGUNDOS = float(os.getenv("SCRAPER_SAVE_SECONDS", "5"))
+
+# Chromium persistente: se relanza si lleva más de X horas o sus procesos pasan de X MB (0 = sin límite)
+NAVEGADOR_MAX_HORAS = float(os.getenv("BROWSER_MAX_AGE_HOURS", "12"))
+NAVEGADOR_MAX_MB = int(os.getenv("BROWSER_MAX_MEMORY_MB", "1500"))
+
+# Filtro de peticiones del navegador (tipos de recurso y dominios que se abortan)
+def _lista_env(nombre, defecto):
+    return [x.strip().lower() for x in os.getenv(nombre, defecto).split(",") if x.strip()]
+
+FILTRO_ACTIVO = os.getenv("BROWSER_BLOCKING", "true").lower() in ["true", "1", "yes", "si", "on"]
+# Sin 'stylesheet': listar_hilos decide qué hilos están ocultos con el CSS del foro
+FILTRO_TIPOS = _lista_env("BLOCK_RESOURCE_TYPES", "image,media,font")
+FILTRO_DOMINIOS = _lista_env("BLOCK_DOMAINS", "doubleclick.net,googlesyndication.com,googleadservices.com,"
+                             "google-analytics.com,googletagmanager.com,adservice.google.com,facebook.net,"
+                             "popads.net,propellerads.com,exoclick.com,juicyads.com,adsterra.com,onclickads.net")
+FILTRO_SCRIPTS_TERCEROS = os.getenv("BLOCK_THIRD_PARTY_SCRIPTS", "true").lower() in ["true", "1", "yes", "si", "on"]
+# Siempre permitidos (desafíos de Cloudflare)
+FILTRO_PERMITIDOS = _lista_env("ALLOW_DOMAINS", "challenges.cloudflare.com,cloudflare.com")
+
+# Leer los hilos por HTTP con las cookies del navegador (Chromium solo para login y desafíos)
+SCRAPER_HTTP = os.getenv("SCRAPER_HTTP_FETCH", "true").lower() in ["true", "1", "yes", "si", "on"]
+
+# Escaneo incremental de foros (marca del último hilo visto en la DB)
+FORO_HILOS_PRIMERA_VEZ = int(os.getenv("FORUM_FIRST_SCAN_THREADS", "10"))
+FORO_PAGINAR_SI_NUEVOS = int(os.getenv("FORUM_PAGE_FORWARD_THRESHOLD", "15"))
+FORO_MAX_PAGINAS = max(1, int(os.getenv("FORUM_MAX_PAGES", "5")))
+# Ciclos seguidos que un hilo puede fallar antes de que la marca lo deje atrás
+FORO_MAX_FALLOS_HILO = max(1, int(os.getenv("FORUM_THREAD_MAX_FAILURES", "3")))
+
 # Paralelismo y Límites
 MAX_WORKERS = int(os.getenv("MAX_PARALLEL_DOWNLOADS", "10"))
 
@@ -72,6 +119,47 @@ except: SPEED_LIMIT_MB = 0
 _enable_txt = os.getenv("ENABLE_SPEED_LIMIT", "true").lower()
 ENABLE_SPEED_LIMIT = _enable_txt in ["true", "1", "yes", "si", "on"]
 
+# Planificador de slots: "priority" (película más avanzada, formato, empujones) o "fifo"
+MODO_PLANIFICADOR = os.getenv("SCHEDULER_MODE", "priority").lower()
+PRIORIDAD_FORMATOS = [f.strip() for f in os.getenv("FORMAT_PRIORITY", "x265,1080p,m1080p,2160p").split(",") if f.strip()]
+
+# Descarga segmentada (varias conexiones HTTP Range por archivo)
+SEGMENTOS_DESCARGA = max(1, int(os.getenv("DOWNLOAD_SEGMENTS", "4")))
+SEGMENTO_MIN_MB = int(os.getenv("DOWNLOAD_SEGMENT_MIN_MB", "32"))
+
+# Resolución de enlaces en paralelo (límites por proveedor debrid)
+UNRESTRICT_WORKERS = int(os.getenv("UNRESTRICT_WORKERS", "8"))
+RD_UNRESTRICT_CONCURRENCIA = int(os.getenv("RD_UNRESTRICT_CONCURRENCY", "4"))
+RD_UNRESTRICT_POR_MINUTO = int(os.getenv("RD_UNRESTRICT_PER_MINUTE", "200"))
+DL_UNRESTRICT_CONCURRENCIA = int(os.getenv("DL_UNRESTRICT_CONCURRENCY", "2"))
+DL_UNRESTRICT_POR_MINUTO = int(os.getenv("DL_UNRESTRICT_PER_MINUTE", "60"))
+
+# Hedging: copia especulativa de partes rezagadas desde otro mirror
+HEDGE_ACTIVO = os.getenv("HEDGE_ENABLED", "true").lower() in ["true", "1", "yes", "si", "on"]
+HEDGE_FACTOR = float(os.getenv("HEDGE_FACTOR", "2.5"))           # llegada prevista > factor x mediana de las hermanas
+HEDGE_MIN_FRACCION = float(os.getenv("HEDGE_MIN_FRACTION", "0.5")) # fracción de partes ya terminadas para comparar
+HEDGE_MIN_SEGUNDOS = int(os.getenv("HEDGE_MIN_SECONDS", "120"))  # no juzgar descargas recién empezadas
+HEDGE_MAX_PARALELAS = int(os.getenv("HEDGE_MAX_PARALLEL", "2"))
+HEDGE_INTERVALO = int(os.getenv("HEDGE_CHECK_SECONDS", "15"))
+
+# Caché persistente de enlaces ya resueltos (enlace hoster -> URL premium)
+UNRESTRICT_CACHE_FILE = os.path.join(CONFIG_DIR, "cache_enlaces.json")
+UNRESTRICT_CACHE_TTL_HORAS = float(os.getenv("UNRESTRICT_CACHE_TTL_HOURS", "4"))
+
+# Sesión HTTP compartida (keep-alive, límites por host y reintentos)
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "20"))
+HTTP_POOL_POR_HOST = int(os.getenv("HTTP_POOL_PER_HOST", str(MAX_WORKERS * SEGMENTOS_DESCARGA)))
+HTTP_REINTENTOS = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "1.0"))
+
+# Ranking adaptativo de mirrors según el rendimiento medido
+RENDIMIENTO_FILE = os.path.join(CONFIG_DIR, "rendimiento_mirrors.json")
+RENDIMIENTO_MB_PRIOR = float(os.getenv("MIRROR_PRIOR_MB", "20"))
+
+# Motor asíncrono (asyncio + httpx) para API debrid y lectura de descargas
+ASYNC_ENGINE = os.getenv("ASYNC_ENGINE", "false").lower() in ["true", "1", "yes", "si", "on"]
+ASYNC_MAX_CONEXIONES = int(os.getenv("ASYNC_MAX_CONNECTIONS", str(MAX_WORKERS * SEGMENTOS_DESCARGA + 8)))
+
 def _parse_time(time_str):
     try:
         if not time_str: return None
@@ -85,6 +173,9 @@ def _parse_time(time_str):
 LIMIT_START_TIME = _parse_time(os.getenv("LIMIT_START_TIME", "08:00:00")) or time(8, 0, 0)
 LIMIT_END_TIME = _parse_time(os.getenv("LIMIT_END_TIME", "20:00:00")) or time(0, 0, 0)
 
+# Horario semanal de ancho de banda (si no existe, se usa LIMIT_START_TIME..LIMIT_END_TIME)
+HORARIO_FILE = os.path.join(CONFIG_DIR, "horario.json")
+
 # Enrutamiento de Servidores
 HOSTER_PREFS = {
     "1fichier": "RD", "4shared": "RD", "brupload": "RD", "clicknupload": "RD",
@@ -1,6 +1,11 @@
 import time
+import threading
 import psycopg2
+import psycopg2.pool
+from psycopg2.extras import execute_values
 import config
+from contextlib import contextmanager
+from urllib.parse import urlparse
 
 # Diccionario de conexión
 DB_CONFIG = {
@@ -11,147 +16,509 @@ DB_CONFIG = {
     "port": config.DB_PORT
 }
 
-def get_connection():
+class PoolConexiones:
     """
-    Intenta conectar a la base de datos con reintentos infinitos.
-    Esto evita que el contenedor muera si la DB tarda en arrancar.
+    Pool de conexiones thread-safe. Si todas están ocupadas, la petición
+    espera turno en lugar de fallar (ThreadedConnectionPool lanzaría
+    PoolError). Antes de entregar una conexión que lleva tiempo parada se
+    comprueba con un SELECT 1 y, si está muerta, se descarta y se abre otra.
     """
-    while True:
+    def __init__(self, maxconn, ping_segundos):
+        self._maxconn = maxconn
+        self._ping_segundos = ping_segundos
+        self._pool = None
+        self._lock = threading.Lock()
+        self._huecos = threading.BoundedSemaphore(maxconn)
+        self._ultimo_uso = {}
+
+    def _asegurar_pool(self):
+        """Crea el pool con reintentos infinitos (la DB puede tardar en arrancar)."""
+        with self._lock:
+            while self._pool is None:
+                try:
+                    self._pool = psycopg2.pool.ThreadedConnectionPool(1, self._maxconn, **DB_CONFIG)
+                except psycopg2.OperationalError as e:
+                    print(f"[DB] ⚠️ Esperando a la base de datos en '{config.DB_HOST}'... ({e})")
+                    time.sleep(5)
+                except Exception as e:
+                    print(f"[DB] ❌ Error crítico de conexión: {e}")
+                    time.sleep(10)
+
+    def _sana(self, conn):
+        if conn.closed: return False
+        # Autocommit para evitar bloqueos (y que el ping no deje transacción abierta)
+        if not conn.autocommit: conn.autocommit = True
+        if time.time() - self._ultimo_uso.get(id(conn), 0) < self._ping_segundos:
+            return True
         try:
-            conn = psycopg2.connect(**DB_CONFIG)
-            # Autocommit para evitar bloqueos
-            conn.autocommit = True
-            return conn
-        except psycopg2.OperationalError as e:
-            print(f"[DB] ⚠️ Esperando a la base de datos en '{config.DB_HOST}'... ({e})")
-            time.sleep(5)
-        except Exception as e:
-            print(f"[DB] ❌ Error crítico de conexión: {e}")
-            time.sleep(10)
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    def obtener(self):
+        self._asegurar_pool()
+        self._huecos.acquire()
+        try:
+            while True:
+                try:
+                    conn = self._pool.getconn()
+                except psycopg2.OperationalError as e:
+                    print(f"[DB] ⚠️ Esperando a la base de datos en '{config.DB_HOST}'... ({e})")
+                    time.sleep(5)
+                    continue
+                if self._sana(conn):
+                    return conn
+                self._ultimo_uso.pop(id(conn), None)
+                self._pool.putconn(conn, close=True)
+        except BaseException:
+            self._huecos.release()
+            raise
+
+    def devolver(self, conn, rota=False):
+        try:
+            self._ultimo_uso[id(conn)] = time.time()
+            if rota or conn.closed:
+                self._ultimo_uso.pop(id(conn), None)
+            self._pool.putconn(conn, close=rota or bool(conn.closed))
+        finally:
+            self._huecos.release()
+
+_pool = PoolConexiones(config.DB_POOL_MAX, config.DB_POOL_PING_SEGUNDOS)
+
+@contextmanager
+def conexion():
+    """
+    Préstamo de una conexión del pool:
+
+        with db.conexion() as conn:
+            cur = conn.cursor()
+            ...
+    """
+    conn = _pool.obtener()
+    rota = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        rota = True
+        raise
+    finally:
+        _pool.devolver(conn, rota)
+
+@contextmanager
+def transaccion(conn):
+    """
+    El pool entrega las conexiones en autocommit: dentro de este bloque las
+    sentencias van en una sola transacción (commit al salir, rollback si algo
+    lanza una excepción) y después se vuelve a autocommit.
+    """
+    conn.autocommit = False
+    try:
+        yield
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+
+# --- MIGRACIONES ---
+# (versión, descripción, sentencias). Solo se añaden al final: una versión
+# aplicada no se vuelve a ejecutar, así que nunca se edita una ya publicada.
+MIGRACIONES = [
+    (1, "Esquema base", [
+        """CREATE TABLE IF NOT EXISTS peliculas_meta (
+            id SERIAL PRIMARY KEY,
+            titulo_base TEXT NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS descargas (
+            id SERIAL PRIMARY KEY,
+            pelicula_id INTEGER REFERENCES peliculas_meta(id),
+            foro_id INTEGER,
+            hilo_id TEXT UNIQUE,
+            formato TEXT,
+            titulo_original TEXT,
+            enlaces TEXT,
+            descargado BOOLEAN DEFAULT FALSE
+        )""",
+    ]),
+    (2, "Índices para las consultas de cada ciclo", [
+        # buscar/crear película por título sin distinguir mayúsculas
+        "CREATE INDEX IF NOT EXISTS idx_peliculas_titulo_lower ON peliculas_meta (LOWER(titulo_base))",
+        # obtener_pendientes / obtener_pendientes_pelicula
+        """CREATE INDEX IF NOT EXISTS idx_descargas_pendientes ON descargas (pelicula_id)
+           WHERE descargado = FALSE AND length(enlaces) > 10""",
+        # obtener_descargas_sin_enlaces
+        """CREATE INDEX IF NOT EXISTS idx_descargas_sin_enlaces ON descargas (id)
+           WHERE descargado = FALSE AND (enlaces IS NULL OR length(enlaces) < 10)""",
+        # marcar_cascada_descargado
+        "CREATE INDEX IF NOT EXISTS idx_descargas_pelicula_formato ON descargas (pelicula_id, formato)",
+    ]),
+    (3, "Tabla enlaces (un mirror por fila)", [
+        """CREATE TABLE IF NOT EXISTS enlaces (
+            id SERIAL PRIMARY KEY,
+            descarga_id INTEGER NOT NULL REFERENCES descargas(id) ON DELETE CASCADE,
+            url TEXT NOT NULL,
+            host TEXT,
+            debrid TEXT,
+            num_parte INTEGER,
+            estado TEXT NOT NULL DEFAULT 'pendiente',
+            fallos INTEGER NOT NULL DEFAULT 0,
+            ultimo_error TEXT,
+            ultimo_fallo TIMESTAMPTZ,
+            actualizado TIMESTAMPTZ DEFAULT now(),
+            UNIQUE (descarga_id, url)
+        )""",
+        # Los enlaces guardados como texto pasan a la tabla; descargas.enlaces
+        # se conserva tal cual pero ya no se lee ni se escribe.
+        """INSERT INTO enlaces (descarga_id, url, host)
+           SELECT d.id, btrim(l.url), lower(substring(btrim(l.url) from '^[a-zA-Z]+://(?:www\\.)?([^/:?#]+)'))
+           FROM descargas d, regexp_split_to_table(d.enlaces, E'\\n') AS l(url)
+           WHERE d.enlaces IS NOT NULL AND btrim(l.url) <> ''
+           ON CONFLICT (descarga_id, url) DO NOTHING""",
+        # Los índices parciales de la v2 miraban la longitud del texto
+        "DROP INDEX IF EXISTS idx_descargas_pendientes",
+        "DROP INDEX IF EXISTS idx_descargas_sin_enlaces",
+        "CREATE INDEX IF NOT EXISTS idx_descargas_no_descargadas ON descargas (pelicula_id) WHERE descargado = FALSE",
+        """CREATE OR REPLACE VIEW hosts_con_fallos AS
+           SELECT host,
+                  count(*) AS enlaces,
+                  count(*) FILTER (WHERE estado = 'muerto') AS muertos,
+                  sum(fallos) AS fallos,
+                  max(ultimo_fallo) AS ultimo_fallo
+           FROM enlaces
+           GROUP BY host
+           HAVING sum(fallos) > 0
+           ORDER BY count(*) FILTER (WHERE estado = 'muerto') DESC, sum(fallos) DESC""",
+    ]),
+    (4, "Marca de agua por foro", [
+        """CREATE TABLE IF NOT EXISTS foros_estado (
+            foro_id INTEGER PRIMARY KEY,
+            ultimo_hilo_id BIGINT NOT NULL,
+            actualizado TIMESTAMPTZ DEFAULT now()
+        )""",
+    ]),
+    (5, "Fallos seguidos por hilo (para que la marca no se atasque)", [
+        """CREATE TABLE IF NOT EXISTS hilos_fallidos (
+            foro_id INTEGER NOT NULL,
+            hilo_id BIGINT NOT NULL,
+            fallos INTEGER NOT NULL DEFAULT 1,
+            ultimo_fallo TIMESTAMPTZ DEFAULT now(),
+            PRIMARY KEY (foro_id, hilo_id)
+        )""",
+    ]),
+]
+
+CLAVE_BLOQUEO_MIGRACIONES = 48151623  # pg_advisory_lock: un solo proceso migrando
+
+def aplicar_migraciones(conn):
+    """Aplica en orden las migraciones pendientes, cada una en su transacción."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            descripcion TEXT,
+            aplicada TIMESTAMPTZ DEFAULT now()
+        )
+    """)
+    cur.execute("SELECT pg_advisory_lock(%s)", (CLAVE_BLOQUEO_MIGRACIONES,))
+    try:
+        cur.execute("SELECT version FROM schema_version")
+        aplicadas = {fila[0] for fila in cur.fetchall()}
+        conn.autocommit = False
+        for version, descripcion, sentencias in MIGRACIONES:
+            if version in aplicadas: continue
+            print(f"[DB] Aplicando migración {version}: {descripcion}")
+            try:
+                for sql in sentencias:
+                    cur.execute(sql)
+                cur.execute("INSERT INTO schema_version (version, descripcion) VALUES (%s, %s)",
+                            (version, descripcion))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    finally:
+        conn.autocommit = True
+        cur.execute("SELECT pg_advisory_unlock(%s)", (CLAVE_BLOQUEO_MIGRACIONES,))
+        cur.close()
+
+_esquema_al_dia = False
 
 def init_db():
+    global _esquema_al_dia
+    if _esquema_al_dia: return  # main() lo llama en cada ciclo
     print("[DB] Verificando conexión inicial...")
-    conn = get_connection()
-    conn.close()
-    print("[DB] Conexión establecida correctamente.")
+    with conexion() as conn:
+        print("[DB] Conexión establecida correctamente.")
+        aplicar_migraciones(conn)
+    _esquema_al_dia = True
 
 # --- FUNCIONES DE GESTIÓN ---
 
-def buscar_pelicula_meta(cur, titulo_limpio):
-    cur.execute("SELECT id FROM peliculas_meta WHERE LOWER(titulo_base)=LOWER(%s)", (titulo_limpio,))
-    return cur.fetchone()
+def buscar_descargas(cur, hilo_ids):
+    """{hilo_id: nº de enlaces vivos} de los hilos que ya están en la tabla (una sola consulta)."""
+    if not hilo_ids: return {}
+    cur.execute("""
+        SELECT d.hilo_id, count(e.id)
+        FROM descargas d
+        LEFT JOIN enlaces e ON e.descarga_id = d.id AND e.estado <> 'muerto'
+        WHERE d.hilo_id = ANY(%s)
+        GROUP BY d.hilo_id
+    """, (list(hilo_ids),))
+    return dict(cur.fetchall())
+
+def _host(url):
+    try: return urlparse(url).netloc.lower().replace("www.", "")
+    except: return None
+
+def insertar_enlaces(cur, filas):
+    """
+    filas: [(descarga_id, url)]. Los que ya estaban se ignoran: un enlace
+    'muerto' sigue muerto aunque el hilo lo siga publicando (una resubida
+    llega siempre con otra URL y entra como fila nueva).
+    """
+    if not filas: return
+    execute_values(cur, """
+        INSERT INTO enlaces (descarga_id, url, host) VALUES %s
+        ON CONFLICT (descarga_id, url) DO NOTHING
+    """, [(did, url, _host(url)) for did, url in filas])
+
+def obtener_ids_peliculas(cur, titulos):
+    """
+    {titulo en minúsculas: id} para todos los títulos, creando de golpe los
+    que aún no existen en peliculas_meta.
+    """
+    por_clave = {t.lower(): t for t in titulos}
+    if not por_clave: return {}
+
+    cur.execute("SELECT id, LOWER(titulo_base) FROM peliculas_meta WHERE LOWER(titulo_base) = ANY(%s)",
+                (list(por_clave),))
+    ids = {clave: pid for pid, clave in cur.fetchall()}
+
+    faltan = [(t,) for clave, t in por_clave.items() if clave not in ids]
+    if faltan:
+        nuevos = execute_values(cur, "INSERT INTO peliculas_meta (titulo_base) VALUES %s RETURNING id, titulo_base",
+                                faltan, fetch=True)
+        for pid, titulo in nuevos:
+            ids[titulo.lower()] = pid
+    return ids
+
+def guardar_hilos(conn, cur, foro_id, hilos):
+    """
+    Guarda uno o varios hilos con unas pocas sentencias. Cada hilo es un dict
+    con hilo_id, titulo_base, formato, titulo_raw y enlaces (lista de URLs,
+    vacía si no hay). Los hilos nuevos entran siempre (aunque sea como hueco).
+    Devuelve los pelicula_id que han recibido enlaces, o None si no se pudo guardar.
+    """
+    # Un mismo hilo dos veces en el VALUES rompería el ON CONFLICT DO UPDATE
+    hilos = list({h["hilo_id"]: h for h in hilos}.values())
+    if not hilos: return []
+    try:
+        # Todo o nada: sin la transacción un fallo a medias dejaría películas
+        # o descargas sin enlaces aunque se devuelva "no guardado"
+        with transaccion(conn):
+            ids = obtener_ids_peliculas(cur, [h["titulo_base"] for h in hilos])
+            filas = [(ids[h["titulo_base"].lower()], int(foro_id), h["hilo_id"], h["formato"],
+                      h["titulo_raw"], False) for h in hilos]
+            # El DO UPDATE no cambia nada; solo sirve para que RETURNING devuelva también los existentes
+            guardadas = execute_values(cur, """
+                INSERT INTO descargas (pelicula_id, foro_id, hilo_id, formato, titulo_original, descargado)
+                VALUES %s
+                ON CONFLICT (hilo_id) DO UPDATE SET hilo_id = EXCLUDED.hilo_id
+                RETURNING id, hilo_id, pelicula_id
+            """, filas, fetch=True)
 
-def insertar_pelicula_meta(conn, cur, titulo_limpio):
-    cur.execute("INSERT INTO peliculas_meta (titulo_base) VALUES (%s) RETURNING id", (titulo_limpio,))
-    pid = cur.fetchone()[0]
-    conn.commit()
-    return pid
+            por_hilo = {hilo_id: (did, pid) for did, hilo_id, pid in guardadas}
+            con_enlaces = [h for h in hilos if h["enlaces"]]
+            insertar_enlaces(cur, [(por_hilo[h["hilo_id"]][0], url) for h in con_enlaces for url in h["enlaces"]])
+        return list({por_hilo[h["hilo_id"]][1] for h in con_enlaces})
+    except Exception as e:
+        print(f"[DB Error] Guardando hilos del foro {foro_id}: {e}")
+        return None
 
-def buscar_descarga(cur, hilo_id):
-    cur.execute("SELECT enlaces FROM descargas WHERE hilo_id = %s", (hilo_id,))
-    return cur.fetchone()
+def obtener_marca_foro(cur, foro_id):
+    """hilo_id más alto ya procesado del foro, o None si nunca se ha escaneado."""
+    cur.execute("SELECT ultimo_hilo_id FROM foros_estado WHERE foro_id = %s", (int(foro_id),))
+    fila = cur.fetchone()
+    return fila[0] if fila else None
 
-def insertar_descarga_hueco(conn, cur, peli_id, foro_id, hilo_id, formato, titulo_raw):
+def guardar_marca_foro(conn, cur, foro_id, hilo_id):
     try:
         cur.execute("""
-            INSERT INTO descargas (pelicula_id, foro_id, hilo_id, formato, titulo_original, descargado)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT (hilo_id) DO NOTHING;
-        """, (peli_id, int(foro_id), hilo_id, formato, titulo_raw, False)) 
+            INSERT INTO foros_estado (foro_id, ultimo_hilo_id) VALUES (%s, %s)
+            ON CONFLICT (foro_id) DO UPDATE
+            SET ultimo_hilo_id = GREATEST(foros_estado.ultimo_hilo_id, EXCLUDED.ultimo_hilo_id), actualizado = now()
+        """, (int(foro_id), hilo_id))
         conn.commit()
     except: conn.rollback()
 
+def registrar_fallos_hilos(conn, cur, foro_id, fallidos, correctos):
+    """
+    Suma un fallo a cada hilo de fallidos y olvida los de correctos.
+    Devuelve {hilo_id: fallos seguidos} de los fallidos ({} si la DB falla).
+    """
+    try:
+        if correctos:
+            cur.execute("DELETE FROM hilos_fallidos WHERE foro_id = %s AND hilo_id = ANY(%s)",
+                        (int(foro_id), list(correctos)))
+        conteo = {}
+        if fallidos:
+            conteo = dict(execute_values(cur, """
+                INSERT INTO hilos_fallidos (foro_id, hilo_id) VALUES %s
+                ON CONFLICT (foro_id, hilo_id) DO UPDATE
+                SET fallos = hilos_fallidos.fallos + 1, ultimo_fallo = now()
+                RETURNING hilo_id, fallos
+            """, [(int(foro_id), h) for h in set(fallidos)], fetch=True))
+        conn.commit()
+        return conteo
+    except Exception as e:
+        print(f"[DB Error] Guardando fallos de hilos del foro {foro_id}: {e}")
+        conn.rollback()
+        return {}
+
 def actualizar_enlaces(conn, cur, hilo_id, enlaces):
     try:
-        cur.execute("UPDATE descargas SET enlaces = %s WHERE hilo_id = %s", (enlaces, hilo_id))
+        cur.execute("SELECT id FROM descargas WHERE hilo_id = %s", (hilo_id,))
+        fila = cur.fetchone()
+        if fila: insertar_enlaces(cur, [(fila[0], url) for url in enlaces])
         conn.commit()
     except: conn.rollback()
 
 def marcar_como_descargado(did):
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("UPDATE descargas SET descargado = TRUE WHERE id = %s", (did,))
-        conn.commit()
-        cur.close()
-        conn.close()
+        with conexion() as conn:
+            cur = conn.cursor()
+            cur.execute("UPDATE descargas SET descargado = TRUE WHERE id = %s", (did,))
+            conn.commit()
+            cur.close()
         return True
     except Exception as e:
         print(f"[DB Error] Update fallido: {e}")
         return False
 
+_SQL_PENDIENTES = """
+    SELECT d.id, m.id, m.titulo_base, d.formato, d.titulo_original,
+           e.id, e.url, e.host, e.debrid, e.num_parte, e.fallos
+    FROM descargas d
+    JOIN peliculas_meta m ON d.pelicula_id = m.id
+    JOIN enlaces e ON e.descarga_id = d.id AND e.estado <> 'muerto'
+    WHERE d.descargado = FALSE
+"""
+
+def _agrupar_enlaces(filas):
+    """Una entrada por descarga con su lista de enlaces vivos."""
+    descargas = {}
+    for did, pid, titulo, formato, titulo_orig, eid, url, host, debrid, num_parte, fallos in filas:
+        if did not in descargas:
+            descargas[did] = {"id": did, "pid": pid, "titulo": titulo, "formato": formato,
+                              "titulo_orig": titulo_orig, "enlaces": []}
+        descargas[did]["enlaces"].append({"id": eid, "url": url, "host": host, "debrid": debrid,
+                                          "num_parte": num_parte, "fallos": fallos})
+    return list(descargas.values())
+
 def obtener_pendientes(cur):
-    query = """
-        SELECT d.id, m.id as pid, m.titulo_base, d.formato, d.enlaces, d.titulo_original
-        FROM descargas d
-        JOIN peliculas_meta m ON d.pelicula_id = m.id
-        WHERE d.descargado = FALSE 
-          AND d.enlaces IS NOT NULL 
-          AND length(d.enlaces) > 10
-    """
-    cur.execute(query)
-    resultados = cur.fetchall()
-    
-    if not resultados:
-        cur.execute("SELECT count(*) FROM descargas WHERE descargado = FALSE")
-        total = cur.fetchone()[0]
-        if total > 0:
-            pass # Silenciamos logs para no saturar
-            
-    return resultados
+    cur.execute(_SQL_PENDIENTES + " ORDER BY d.id, e.id")
+    return _agrupar_enlaces(cur.fetchall())
 
-def obtener_descargas_sin_enlaces():
-    conn = get_connection()
-    cur = conn.cursor()
+def obtener_pendientes_pelicula(cur, pid):
+    cur.execute(_SQL_PENDIENTES + " AND m.id = %s ORDER BY d.id, e.id", (pid,))
+    return _agrupar_enlaces(cur.fetchall())
+
+def registrar_enlace_resuelto(descarga_id, url, debrid, num_parte):
+    """Apunta por qué debrid salió y qué parte es (la próxima vez no hace falta adivinarla)."""
+    if descarga_id is None: return
     try:
-        query = """
-            SELECT hilo_id, titulo_original 
-            FROM descargas 
-            WHERE descargado = FALSE 
-              AND (enlaces IS NULL OR length(enlaces) < 10)
-        """
-        cur.execute(query)
-        return cur.fetchall()
+        with conexion() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE enlaces SET debrid = %s, num_parte = %s, actualizado = now()
+                WHERE descarga_id = %s AND url = %s
+            """, (debrid, num_parte, descarga_id, url))
+            cur.close()
     except Exception as e:
-        print(f"[DB Error] Buscando rotas: {e}")
-        return []
-    finally:
-        cur.close()
-        conn.close()
+        print(f"[DB Error] Guardando enlace resuelto: {e}")
 
-def marcar_cascada_descargado(pid, formato_descargado):
+def registrar_resultado_enlace(descarga_id, url, ok, error=None):
+    """
+    Éxito: el enlace vuelve a estado 'ok'. Fallo del hoster o de la descarga
+    (los del debrid no se registran): suma uno y, tras ENLACE_MAX_FALLOS
+    seguidos, queda 'muerto' y no se vuelve a intentar.
+    """
+    if descarga_id is None: return
     try:
-        conn = get_connection()
+        with conexion() as conn:
+            cur = conn.cursor()
+            if ok:
+                cur.execute("""
+                    UPDATE enlaces SET estado = 'ok', fallos = 0, actualizado = now()
+                    WHERE descarga_id = %s AND url = %s
+                """, (descarga_id, url))
+            else:
+                cur.execute("""
+                    UPDATE enlaces
+                    SET fallos = fallos + 1, ultimo_error = %s, ultimo_fallo = now(), actualizado = now(),
+                        estado = CASE WHEN fallos + 1 >= %s THEN 'muerto' ELSE 'fallo' END
+                    WHERE descarga_id = %s AND url = %s
+                """, (error, config.ENLACE_MAX_FALLOS, descarga_id, url))
+            cur.close()
+    except Exception as e:
+        print(f"[DB Error] Guardando resultado de enlace: {e}")
+
+def obtener_descargas_sin_enlaces():
+    with conexion() as conn:
         cur = conn.cursor()
-        target_formats = [formato_descargado]
-        if formato_descargado == "x265": target_formats.extend(["1080p", "m1080p"])
-        elif formato_descargado == "1080p": target_formats.extend(["m1080p"])
-            
-        cur.execute("""
-            UPDATE descargas 
-            SET descargado = TRUE 
-            WHERE pelicula_id = %s AND formato = ANY(%s)
-        """, (pid, target_formats))
-        conn.commit()
-        cur.close()
-        conn.close()
+        try:
+            # Sin enlaces: se relee cada ciclo. Con todos muertos: solo cada
+            # ENLACE_REVISAR_MUERTOS_HORAS, por si el hilo trae una resubida
+            query = """
+                SELECT d.hilo_id, d.titulo_original
+                FROM descargas d
+                WHERE d.descargado = FALSE
+                  AND NOT EXISTS (SELECT 1 FROM enlaces e WHERE e.descarga_id = d.id AND e.estado <> 'muerto')
+                  AND NOT EXISTS (SELECT 1 FROM enlaces e WHERE e.descarga_id = d.id
+                                  AND e.ultimo_fallo > now() - make_interval(hours => %s))
+            """
+            cur.execute(query, (config.ENLACE_REVISAR_MUERTOS_HORAS,))
+            return cur.fetchall()
+        except Exception as e:
+            print(f"[DB Error] Buscando rotas: {e}")
+            return []
+        finally:
+            cur.close()
+
+def marcar_cascada_descargado(pid, formato_descargado):
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+            target_formats = [formato_descargado]
+            if formato_descargado == "x265": target_formats.extend(["1080p", "m1080p"])
+            elif formato_descargado == "1080p": target_formats.extend(["m1080p"])
+                
+            cur.execute("""
+                UPDATE descargas 
+                SET descargado = TRUE 
+                WHERE pelicula_id = %s AND formato = ANY(%s)
+            """, (pid, target_formats))
+            conn.commit()
+            cur.close()
         return True
     except: return False
 
 def obtener_ultimas_novedades(limit=12):
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        query = """
-            SELECT m.titulo_base, d.formato, d.titulo_original
-            FROM descargas d
-            JOIN peliculas_meta m ON d.pelicula_id = m.id
-            ORDER BY d.id DESC
-            LIMIT %s
-        """
-        cur.execute(query, (limit,))
-        return cur.fetchall()
-    except: return []
-    finally:
-        cur.close()
-        conn.close()
\ No newline at end of file
+    with conexion() as conn:
+        cur = conn.cursor()
+        try:
+            query = """
+                SELECT m.titulo_base, d.formato, d.titulo_original
+                FROM descargas d
+                JOIN peliculas_meta m ON d.pelicula_id = m.id
+                ORDER BY d.id DESC
+                LIMIT %s
+            """
+            cur.execute(query, (limit,))
+            return cur.fetchall()
+        except: return []
+        finally:
+            cur.close()
@@ -1,10 +1,18 @@
 import os
+import json
 import time
-import requests
+import asyncio
+import threading
 import config
-from urllib.parse import unquote
-from utils import debe_aplicar_limite, sanitizar_nombre
+import re
+from urllib.parse import unquote, urlparse
+from utils import sanitizar_nombre
 from monitor import state 
+from motor_async import motor
+from sesion_http import obtener_sesion
+from rendimiento import tabla as tabla_rendimiento
+from ancho_banda import limitador
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 def determinar_debrid(enlace):
     for dominio, servicio in config.HOSTER_PREFS.items():
@@ -21,74 +29,512 @@ def obtener_nombre_archivo_de_url(url):
     except: pass
     return "archivo_desconocido.dat"
 
+class _LimitadorApi:
+    """Máximo de peticiones simultáneas y ritmo (peticiones/minuto) hacia un debrid."""
+    def __init__(self, concurrencia, por_minuto):
+        self._sem = threading.BoundedSemaphore(max(1, concurrencia))
+        self._lock = threading.Lock()
+        self._intervalo = 60.0 / por_minuto if por_minuto > 0 else 0
+        self._proximo = 0.0
+
+    def __enter__(self):
+        self._sem.acquire()
+        with self._lock:
+            ahora = time.monotonic()
+            espera = self._proximo - ahora
+            self._proximo = max(ahora, self._proximo) + self._intervalo
+        if espera > 0: time.sleep(espera)
+        return self
+
+    def __exit__(self, *args):
+        self._sem.release()
+
+LIMITES_API = {
+    "RD": _LimitadorApi(config.RD_UNRESTRICT_CONCURRENCIA, config.RD_UNRESTRICT_POR_MINUTO),
+    "DL": _LimitadorApi(config.DL_UNRESTRICT_CONCURRENCIA, config.DL_UNRESTRICT_POR_MINUTO),
+}
+
+def _post_api(url, headers, data):
+    """POST a la API del debrid, por el motor asíncrono si está activo."""
+    if motor.disponible():
+        # La corrutina se crea aquí pero motor.cliente solo se toca al ejecutarla,
+        # cuando ejecutar() ya ha arrancado el loop y creado el cliente
+        async def _post():
+            return await motor.cliente.post(url, headers=headers, data=data, timeout=30)
+        return motor.ejecutar(_post())
+    return obtener_sesion().post(url, headers=headers, data=data, timeout=30)
+
+def adivinar_nombre_fichero(link):
+    """
+    Nombre de archivo que algunos hosters incluyen en el propio enlace
+    (rapidgator.net/file/<id>/Peli.part01.rar.html). None si no aparece.
+    """
+    try:
+        path = unquote(urlparse(link).path)
+    except: return None
+    for segmento in reversed(path.split("/")):
+        nombre = re.sub(r'\.html?$', '', segmento, flags=re.IGNORECASE)
+        if re.search(r'\.(rar|r\d{2}|zip|7z|\d{3}|mkv|mp4|avi|iso)$', nombre, re.IGNORECASE):
+            return sanitizar_nombre(nombre)
+    return None
+
+# Respuestas de la API que culpan al enlace (fichero borrado, hoster no
+# soportado...). El resto (mantenimiento, token, 429, cuota) es problema del
+# debrid y no cuenta para marcar el enlace como muerto.
+ERRORES_ENLACE_RD = {2, 16, 24, 35}  # bad_parameter, hoster_unsupported, unavailable_file, infringing_file
+ERRORES_ENLACE_DL = {"badFileUrl", "hostNotValid", "fileNotFound", "fileNotAvailable"}
+
 def unrestrict_rd(link):
-    if not config.RD_TOKEN: return None, None
+    """(url, nombre, None) si va bien; (None, None, 'hoster'|'debrid') si no."""
+    if not config.RD_TOKEN: return None, None, "debrid"
     print(f"   [API] Solicitando a Real-Debrid: {link[:40]}...")
     try:
         url = "https://api.real-debrid.com/rest/1.0/unrestrict/link"
         headers = {"Authorization": f"Bearer {config.RD_TOKEN}"}
-        r = requests.post(url, headers=headers, data={"link": link}, timeout=30)
+        with LIMITES_API["RD"]:
+            r = _post_api(url, headers, {"link": link})
         if r.status_code == 200:
             data = r.json()
-            return data.get("download"), sanitizar_nombre(data.get("filename"))
-        elif r.status_code == 503:
+            return data.get("download"), sanitizar_nombre(data.get("filename")), None
+        try: codigo = r.json().get("error_code")
+        except Exception: codigo = None
+        if codigo in ERRORES_ENLACE_RD:
+            print(f"   [API] RD rechaza el enlace ({r.status_code}): {r.text}")
+            return None, None, "hoster"
+        if r.status_code == 503:
             print("   [API] Real-Debrid en mantenimiento.")
         else:
             print(f"   [API] Error RD ({r.status_code}): {r.text}")
     except Exception as e: 
         print(f"   [API] Excepción conectando a RD: {e}")
-    return None, None
+    return None, None, "debrid"
 
 def unrestrict_dl(link):
-    if not config.DL_TOKEN: return None, None
+    """(url, nombre, None) si va bien; (None, None, 'hoster'|'debrid') si no."""
+    if not config.DL_TOKEN: return None, None, "debrid"
     print(f"   [API] Solicitando a Debrid-Link: {link[:40]}...")
     try:
         url = "https://debrid-link.com/api/v2/downloader/add"
         headers = {"Authorization": f"Bearer {config.DL_TOKEN}"}
-        r = requests.post(url, headers=headers, data={"url": link}, timeout=30)
+        with LIMITES_API["DL"]:
+            r = _post_api(url, headers, {"url": link})
+        try: res = r.json()
+        except Exception: res = {}
+        if r.status_code == 200 and res.get("success"):
+            val = res["value"][0]
+            return val.get("downloadUrl"), sanitizar_nombre(val.get("name")), None
+        if res.get("error") in ERRORES_ENLACE_DL:
+            print(f"   [API] DL rechaza el enlace: {res.get('error')}")
+            return None, None, "hoster"
         if r.status_code == 200:
-            res = r.json()
-            if res.get("success"):
-                val = res["value"][0]
-                return val.get("downloadUrl"), sanitizar_nombre(val.get("name"))
-            else:
-                print(f"   [API] Error DL: {res.get('error')}")
+            print(f"   [API] Error DL: {res.get('error')}")
         else:
             print(f"   [API] Error HTTP DL: {r.status_code}")
     except Exception as e:
         print(f"   [API] Excepción conectando a DL: {e}")
-    return None, None
+    return None, None, "debrid"
+
+class CacheEnlaces:
+    """
+    Caché en disco (CONFIG_DIR) de enlaces ya resueltos con su caducidad.
+    Evita repetir llamadas a la API tras reinicios o reintentos.
+    """
+    def __init__(self, ruta, ttl_horas):
+        self._lock = threading.Lock()
+        self.ruta = ruta
+        self.ttl = ttl_horas * 3600
+        self._datos = None
+
+    def _cargar(self):
+        if self._datos is not None: return
+        self._datos = {}
+        try:
+            if os.path.exists(self.ruta):
+                with open(self.ruta, 'r', encoding='utf-8') as f:
+                    self._datos = json.load(f)
+        except Exception as e:
+            print(f"   [CACHE] No se pudo leer {self.ruta}: {e}")
+
+    def _guardar(self):
+        ahora = time.time()
+        self._datos = {k: v for k, v in self._datos.items() if v.get("expira", 0) > ahora}
+        try:
+            with open(self.ruta + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump(self._datos, f)
+            os.replace(self.ruta + ".tmp", self.ruta)
+        except Exception as e:
+            print(f"   [CACHE] No se pudo guardar {self.ruta}: {e}")
+
+    def obtener(self, link):
+        if self.ttl <= 0: return None
+        with self._lock:
+            self._cargar()
+            entrada = self._datos.get(link)
+            if not entrada: return None
+            if entrada.get("expira", 0) <= time.time():
+                del self._datos[link]
+                self._guardar()
+                return None
+            return entrada["url"], entrada["nombre"], entrada["debrid"]
+
+    def guardar(self, link, url, nombre, debrid_source):
+        if self.ttl <= 0: return
+        with self._lock:
+            self._cargar()
+            self._datos[link] = {"url": url, "nombre": nombre, "debrid": debrid_source, "expira": time.time() + self.ttl}
+            self._guardar()
+
+    def invalidar_url(self, url):
+        """Elimina las entradas que apuntan a esta URL premium (p.ej. tras un 403/404)."""
+        with self._lock:
+            self._cargar()
+            claves = [k for k, v in self._datos.items() if v.get("url") == url]
+            for k in claves: del self._datos[k]
+            if claves: self._guardar()
+
+cache_enlaces = CacheEnlaces(config.UNRESTRICT_CACHE_FILE, config.UNRESTRICT_CACHE_TTL_HORAS)
 
 def obtener_enlace_premium(link):
+    """
+    (url, nombre, debrid, None) si se resuelve. Si no, (None, None, None, culpa):
+    'hoster' si algún debrid rechazó el propio enlace, 'debrid' si solo fallaron
+    los servicios (mantenimiento, token, límite de peticiones...).
+    """
+    en_cache = cache_enlaces.obtener(link)
+    if en_cache:
+        print(f"   [CACHE] Enlace ya resuelto: {link[:40]}...")
+        return (*en_cache, None)
+
+    url, name, debrid_source, culpa = _resolver_premium(link)
+    if url and name:
+        cache_enlaces.guardar(link, url, name, debrid_source)
+    return url, name, debrid_source, culpa
+
+def _resolver_premium(link):
     servicio_preferido = determinar_debrid(link)
+    culpas = []
     
     if servicio_preferido == "RD":
-        url, name = unrestrict_rd(link)
-        if url: return url, name, "RD"
+        url, name, culpa = unrestrict_rd(link)
+        if url: return url, name, "RD", None
+        culpas.append(culpa)
         
         if config.DL_TOKEN: # Fallback
             print("   [INFO] Falló RD. Probando fallback con Debrid-Link...")
-            url, name = unrestrict_dl(link)
-            if url: return url, name, "DL"
+            url, name, culpa = unrestrict_dl(link)
+            if url: return url, name, "DL", None
+            culpas.append(culpa)
             
     elif servicio_preferido == "DL":
-        url, name = unrestrict_dl(link)
-        if url: return url, name, "DL"
+        url, name, culpa = unrestrict_dl(link)
+        if url: return url, name, "DL", None
+        culpas.append(culpa)
         
         if config.RD_TOKEN: # Fallback
             print("   [INFO] Falló DL. Probando fallback con Real-Debrid...")
-            url, name = unrestrict_rd(link)
-            if url: return url, name, "RD"
+            url, name, culpa = unrestrict_rd(link)
+            if url: return url, name, "RD", None
+            culpas.append(culpa)
             
-    return None, None, None
+    return None, None, None, "hoster" if "hoster" in culpas else "debrid"
+
+class _Progreso:
+    """Acumula los bytes de todos los segmentos de un archivo y los publica en el monitor."""
+    def __init__(self, titulo, nombre_archivo, total_size, host, debrid_source, formato):
+        self._lock = threading.Lock()
+        self.titulo = titulo
+        self.nombre_archivo = nombre_archivo
+        self.total_size = total_size
+        self.host = host
+        self.debrid_source = debrid_source
+        self.formato = formato
+        self.descargado = 0
+        # Bytes que ya estaban en disco al reanudar (no cuentan para la velocidad)
+        self.base = 0
+        self.start_time = time.time()
+
+    def velocidad(self):
+        elapsed = time.time() - self.start_time
+        if elapsed <= 0: return 0.0
+        return ((self.descargado - self.base) / (1024 * 1024)) / elapsed
+
+    def sumar(self, n):
+        with self._lock:
+            self.descargado += n
+            speed_mb = self.velocidad()
+            state.update_download(
+                self.titulo,
+                self.nombre_archivo,
+                self.descargado,
+                self.total_size,
+                speed_mb,
+                host=self.host,
+                debrid=self.debrid_source,
+                formato=self.formato
+            )
+        return speed_mb
+
+class ControlDescarga:
+    """
+    Permite seguir y cancelar desde fuera una descarga en curso. Lo usa el
+    hedging de main: si una parte va muy atrasada se lanza otra copia desde
+    otro mirror y la que pierda se cancela.
+    """
+    def __init__(self, hedge=False):
+        self.hedge = hedge
+        self.cancelado = threading.Event()
+        self.progreso = None
+        self.inicio = None
+
+    def cancelar(self):
+        self.cancelado.set()
+
+    def segundos_restantes(self):
+        """Proyección de lo que falta con la velocidad actual (None si aún no se sabe)."""
+        p = self.progreso
+        if not p or not p.total_size: return None
+        velocidad = p.velocidad() * 1024 * 1024
+        if velocidad <= 0: return float("inf")
+        return (p.total_size - p.descargado) / velocidad
+
+def _contabilizar(progreso, n):
+    """Publica el progreso y devuelve cuánto esperar según el limitador global."""
+    progreso.sumar(n)
+    return limitador.reservar(progreso, n)
+
+def _interpretar_sondeo(status_code, cabeceras, url_final):
+    etag = cabeceras.get("etag")
+    if status_code == 206:
+        # Content-Range: bytes 0-0/123456
+        rango = cabeceras.get("content-range", "")
+        if "/" in rango and not rango.endswith("*"):
+            return url_final, int(rango.split("/")[-1]), True, etag
+        return url_final, 0, False, etag
+    total = int(cabeceras.get("content-length", 0))
+    acepta = cabeceras.get("accept-ranges", "").lower() == "bytes"
+    return url_final, total, acepta, etag
+
+def _sondear_servidor(url, headers):
+    """
+    Pide el primer byte del archivo para averiguar tamaño y soporte de rangos.
+    Devuelve (url_final, tamaño, acepta_rangos, etag).
+    """
+    h = dict(headers)
+    h["Range"] = "bytes=0-0"
+    if motor.disponible():
+        return motor.ejecutar(_sondear_servidor_async(url, h))
+    with obtener_sesion().get(url, stream=True, allow_redirects=True, headers=h, timeout=60) as r:
+        r.raise_for_status()
+        return _interpretar_sondeo(r.status_code, r.headers, r.url)
+
+async def _sondear_servidor_async(url, headers):
+    async with motor.cliente.stream("GET", url, headers=headers) as r:
+        r.raise_for_status()
+        return _interpretar_sondeo(r.status_code, r.headers, str(r.url))
+
+# --- REANUDACIÓN (.part + sidecar) ---
+
+def _ruta_sidecar(ruta_temp):
+    return ruta_temp + ".json"
+
+def _guardar_sidecar(ruta_temp, datos):
+    ruta = _ruta_sidecar(ruta_temp)
+    try:
+        with open(ruta + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(datos, f)
+        os.replace(ruta + ".tmp", ruta)
+    except Exception as e:
+        print(f"   [WARN] No se pudo guardar el estado de reanudación: {e}")
+
+def _cargar_reanudacion(ruta_temp, url, nombre_archivo, total_size, etag):
+    """
+    Devuelve los segmentos guardados si el .part corresponde al mismo archivo.
+    Los enlaces debrid caducan, así que una URL distinta es válida mientras
+    coincidan nombre y tamaño; el ETag solo se compara si la URL es la misma.
+    """
+    ruta = _ruta_sidecar(ruta_temp)
+    if not os.path.exists(ruta_temp) or not os.path.exists(ruta):
+        return None
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            datos = json.load(f)
+    except: return None
+
+    if datos.get("nombre") != nombre_archivo or datos.get("total") != total_size:
+        return None
+    if os.path.getsize(ruta_temp) != total_size:
+        return None
+    if datos.get("url") == url and datos.get("etag") and etag and datos.get("etag") != etag:
+        return None
+    return datos.get("segmentos")
+
+def _borrar_parcial(ruta_temp):
+    for ruta in (ruta_temp, _ruta_sidecar(ruta_temp)):
+        if os.path.exists(ruta):
+            try: os.remove(ruta)
+            except: pass
+
+def _calcular_segmentos(total_size):
+    n = config.SEGMENTOS_DESCARGA
+    minimo = config.SEGMENTO_MIN_MB * 1024 * 1024
+    if minimo > 0:
+        n = min(n, max(1, total_size // minimo))
+    tam = total_size // n
+    segmentos = []
+    for i in range(n):
+        inicio = i * tam
+        fin = total_size - 1 if i == n - 1 else inicio + tam - 1
+        segmentos.append({"inicio": inicio, "fin": fin, "hecho": 0})
+    return segmentos
+
+def _abrir_en(ruta, modo, posicion=0):
+    f = open(ruta, modo)
+    if posicion: f.seek(posicion)
+    return f
+
+def _volcar_chunk(f, chunk, progreso, seg=None, guardar=None):
+    """
+    Parte bloqueante de cada chunk: disco, sidecar y monitor (locks de hilos).
+    El motor asíncrono la ejecuta en el executor para no parar el event loop.
+    Devuelve la espera que pide el limitador de ancho de banda.
+    """
+    f.write(chunk)
+    if seg is not None: seg["hecho"] += len(chunk)
+    espera = _contabilizar(progreso, len(chunk))
+    if guardar: guardar()
+    return espera
+
+def _descargar_segmento(url, ruta_temp, seg, progreso, headers, detener, guardar):
+    if seg["inicio"] + seg["hecho"] > seg["fin"]:
+        return
+    h = dict(headers)
+    h["Range"] = f"bytes={seg['inicio'] + seg['hecho']}-{seg['fin']}"
+    with obtener_sesion().get(url, stream=True, headers=h, timeout=60) as r:
+        r.raise_for_status()
+        if r.status_code != 206:
+            raise IOError(f"El servidor ignoró el rango (HTTP {r.status_code})")
+        with open(ruta_temp, 'r+b') as f:
+            f.seek(seg["inicio"] + seg["hecho"])
+            for chunk in r.iter_content(chunk_size=1024 * 1024):
+                if detener():
+                    raise IOError("Descarga abortada")
+                if chunk:
+                    espera = _volcar_chunk(f, chunk, progreso, seg, guardar)
+                    if espera: time.sleep(espera)
+    if seg["inicio"] + seg["hecho"] <= seg["fin"]:
+        raise IOError("Segmento incompleto")
+
+async def _descargar_segmento_async(url, ruta_temp, seg, progreso, headers, detener, guardar):
+    if seg["inicio"] + seg["hecho"] > seg["fin"]:
+        return
+    h = dict(headers)
+    h["Range"] = f"bytes={seg['inicio'] + seg['hecho']}-{seg['fin']}"
+    loop = asyncio.get_running_loop()
+    async with motor.cliente.stream("GET", url, headers=h) as r:
+        r.raise_for_status()
+        if r.status_code != 206:
+            raise IOError(f"El servidor ignoró el rango (HTTP {r.status_code})")
+        f = await loop.run_in_executor(None, _abrir_en, ruta_temp, 'r+b', seg["inicio"] + seg["hecho"])
+        try:
+            async for chunk in r.aiter_bytes(chunk_size=1024 * 1024):
+                if detener():
+                    raise IOError("Descarga abortada")
+                if chunk:
+                    espera = await loop.run_in_executor(None, _volcar_chunk, f, chunk, progreso, seg, guardar)
+                    if espera: await asyncio.sleep(espera)
+        finally:
+            await loop.run_in_executor(None, f.close)
+    if seg["inicio"] + seg["hecho"] <= seg["fin"]:
+        raise IOError("Segmento incompleto")
+
+async def _descargar_segmentos_async(url, ruta_temp, segmentos, progreso, headers, abortar, detener, guardar):
+    tareas = [asyncio.ensure_future(_descargar_segmento_async(url, ruta_temp, seg, progreso, headers, detener, guardar)) for seg in segmentos]
+    try:
+        await asyncio.gather(*tareas)
+    except BaseException:
+        abortar.set()
+        for t in tareas: t.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+        raise
+
+def _descargar_segmentado(url, ruta_temp, total_size, progreso, headers, sidecar, cancelado):
+    segmentos = sidecar["segmentos"]
+    if not os.path.exists(ruta_temp):
+        # Reservamos el archivo completo para que cada segmento escriba en su sitio
+        with open(ruta_temp, 'wb') as f:
+            f.truncate(total_size)
+
+    lock_guardado = threading.Lock()
+    ultimo_guardado = [0.0]
 
-def descargar_archivo(url, carpeta_destino, titulo_referencia, host_original=None, debrid_source=None, formato_peli=None):
+    def guardar(forzar=False):
+        with lock_guardado:
+            if forzar or time.time() - ultimo_guardado[0] > 2:
+                _guardar_sidecar(ruta_temp, sidecar)
+                ultimo_guardado[0] = time.time()
+
+    guardar(forzar=True)
+    # 'abortar' para al resto de segmentos si uno falla; 'cancelado' viene de fuera (hedging)
+    abortar = threading.Event()
+    detener = lambda: abortar.is_set() or cancelado.is_set()
+    try:
+        if motor.disponible():
+            motor.ejecutar(_descargar_segmentos_async(url, ruta_temp, segmentos, progreso, headers, abortar, detener, guardar))
+            return
+        with ThreadPoolExecutor(max_workers=len(segmentos)) as executor:
+            futures = [executor.submit(_descargar_segmento, url, ruta_temp, seg, progreso, headers, detener, guardar) for seg in segmentos]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+            except Exception:
+                abortar.set()
+                raise
+    finally:
+        guardar(forzar=True)
+
+def _descargar_stream(url, ruta_temp, progreso, headers, cancelado):
+    if motor.disponible():
+        return motor.ejecutar(_descargar_stream_async(url, ruta_temp, progreso, headers, cancelado))
+    with obtener_sesion().get(url, stream=True, allow_redirects=True, headers=headers, timeout=60) as r:
+        r.raise_for_status()
+        progreso.total_size = int(r.headers.get('content-length', 0))
+        with open(ruta_temp, 'wb') as f:
+            for chunk in r.iter_content(chunk_size=1024 * 1024):
+                if cancelado.is_set():
+                    raise IOError("Descarga abortada")
+                if chunk:
+                    espera = _volcar_chunk(f, chunk, progreso)
+                    if espera: time.sleep(espera)
+
+async def _descargar_stream_async(url, ruta_temp, progreso, headers, cancelado):
+    loop = asyncio.get_running_loop()
+    async with motor.cliente.stream("GET", url, headers=headers) as r:
+        r.raise_for_status()
+        progreso.total_size = int(r.headers.get('content-length', 0))
+        f = await loop.run_in_executor(None, _abrir_en, ruta_temp, 'wb')
+        try:
+            async for chunk in r.aiter_bytes(chunk_size=1024 * 1024):
+                if cancelado.is_set():
+                    raise IOError("Descarga abortada")
+                if chunk:
+                    espera = await loop.run_in_executor(None, _volcar_chunk, f, chunk, progreso)
+                    if espera: await asyncio.sleep(espera)
+        finally:
+            await loop.run_in_executor(None, f.close)
+
+def descargar_archivo(url, carpeta_destino, titulo_referencia, host_original=None, debrid_source=None, formato_peli=None, control=None):
     if not os.path.exists(carpeta_destino):
         os.makedirs(carpeta_destino)
+    if control is None: control = ControlDescarga()
         
     nombre_archivo = obtener_nombre_archivo_de_url(url)
     ruta_temp = os.path.join(carpeta_destino, nombre_archivo + ".part")
     ruta_final = os.path.join(carpeta_destino, nombre_archivo)
+    nombre_mostrado = nombre_archivo
+    if control.hedge:
+        # La copia especulativa usa su propio .part para no pisar a la original
+        ruta_temp = os.path.join(carpeta_destino, nombre_archivo + ".hedge.part")
+        nombre_mostrado = f"{nombre_archivo} (hedge)"
     
     if os.path.exists(ruta_final):
         print(f"   [SKIP] Archivo ya existe: {nombre_archivo}")
@@ -96,72 +542,89 @@ def descargar_archivo(url, carpeta_destino, titulo_referencia, host_original=Non
 
     # Bloqueo SEMÁFORO
     print(f"   [ESPERA] Esperando slot de descarga para: {nombre_archivo}...")
-    state.acquire_download_slot()
+    state.acquire_download_slot(titulo_referencia, formato_peli)
+
+    if control.cancelado.is_set() or os.path.exists(ruta_final):
+        state.release_download_slot()
+        return ruta_final if os.path.exists(ruta_final) else None
 
-    print(f"   [DOWNLOAD] Iniciando: {nombre_archivo} ({host_original}) via {debrid_source}")
+    print(f"   [DOWNLOAD] Iniciando: {nombre_mostrado} ({host_original}) via {debrid_source}")
     
+    reanudable = False
     try:
         headers = {"User-Agent": config.DEFAULT_USER_AGENT}
-        with requests.get(url, stream=True, allow_redirects=True, headers=headers, timeout=60) as r:
-            r.raise_for_status()
-            total_size = int(r.headers.get('content-length', 0))
-            
-            chunk_size = 8 * 1024 * 1024 
-            
-            with open(ruta_temp, 'wb') as f:
-                start_time = time.time()
-                descargado = 0
-                
-                for chunk in r.iter_content(chunk_size=chunk_size):
-                    if chunk:
-                        f.write(chunk)
-                        descargado += len(chunk)
-                        
-                        current_time = time.time()
-                        elapsed = current_time - start_time
-                        speed_mb = 0.0
-                        if elapsed > 0:
-                            speed_mb = (descargado / (1024 * 1024)) / elapsed
-                        
-                        # Actualizamos estado con formato incluido
-                        state.update_download(
-                            titulo_referencia, 
-                            nombre_archivo, 
-                            descargado, 
-                            total_size, 
-                            speed_mb, 
-                            host=host_original, 
-                            debrid=debrid_source,
-                            formato=formato_peli
-                        )
-
-                        if config.SPEED_LIMIT_MB > 0 and config.ENABLE_SPEED_LIMIT: 
-                             if debe_aplicar_limite():
-                                if speed_mb > config.SPEED_LIMIT_MB:
-                                    time.sleep(0.5)
+        inicio_sondeo = time.time()
+        url_final, total_size, acepta_rangos, etag = _sondear_servidor(url, headers)
+        ttfb = time.time() - inicio_sondeo
+        progreso = _Progreso(titulo_referencia, nombre_mostrado, total_size, host_original, debrid_source, formato_peli)
+        limitador.registrar(progreso)
+        control.progreso = progreso
+        control.inicio = progreso.start_time
+
+        if acepta_rangos and total_size > 0:
+            segmentos = _cargar_reanudacion(ruta_temp, url, nombre_archivo, total_size, etag)
+            if segmentos:
+                ya_descargado = sum(seg["hecho"] for seg in segmentos)
+                print(f"   [RESUME] Reanudando {nombre_archivo} desde {ya_descargado / (1024 * 1024):.1f} MB")
+                progreso.sumar(ya_descargado)
+                progreso.start_time = time.time()
+                progreso.base = ya_descargado
+            else:
+                _borrar_parcial(ruta_temp)
+                segmentos = _calcular_segmentos(total_size)
+            reanudable = True
+            sidecar = {"url": url, "nombre": nombre_archivo, "total": total_size, "etag": etag, "segmentos": segmentos}
+            _descargar_segmentado(url_final, ruta_temp, total_size, progreso, headers, sidecar, control.cancelado)
+        else:
+            # Sin Accept-Ranges: una única conexión como siempre (no se puede reanudar)
+            _borrar_parcial(ruta_temp)
+            _descargar_stream(url_final, ruta_temp, progreso, headers, control.cancelado)
+        total_size = progreso.total_size or progreso.descargado
 
         end_time = time.time()
-        total_time = end_time - start_time
-        avg_speed = (total_size / (1024 * 1024)) / total_time if total_time > 0 else 0
+        total_time = end_time - progreso.start_time
+        avg_speed = ((total_size - progreso.base) / (1024 * 1024)) / total_time if total_time > 0 else 0
         
         m, s = divmod(total_time, 60)
         h, m = divmod(m, 60)
         duration_str = f"{int(h):02d}:{int(m):02d}:{int(s):02d}"
 
         os.rename(ruta_temp, ruta_final)
+        _borrar_parcial(ruta_temp)
         
         state.release_download_slot()
+        if host_original:
+            tabla_rendimiento.registrar_exito(host_original, debrid_source, avg_speed, ttfb)
         
         # IMPORTANTE: Pasamos formato_peli para que monitor separe el historial
-        state.finish_download(titulo_referencia, nombre_archivo, avg_speed, duration_str, formato=formato_peli)
+        state.finish_download(titulo_referencia, nombre_mostrado, avg_speed, duration_str, formato=formato_peli)
         
         return ruta_final
 
     except Exception as e:
-        print(f"   [ERROR] Falló la descarga de {nombre_archivo}: {e}")
+        if control.cancelado.is_set():
+            # La otra copia (hedging) ganó: no es un fallo del mirror
+            print(f"   [HEDGE] Cancelada: {nombre_mostrado}")
+            state.release_download_slot()
+            state.remove_download(titulo_referencia, nombre_mostrado)
+            _borrar_parcial(ruta_temp)
+            return None
+
+        print(f"   [ERROR] Falló la descarga de {nombre_mostrado}: {e}")
+        # Enlace caducado o retirado: que no se vuelva a servir desde la caché
+        status = getattr(getattr(e, "response", None), "status_code", None)
+        if status in (403, 404, 410):
+            cache_enlaces.invalidar_url(url)
+        if host_original:
+            tabla_rendimiento.registrar_fallo(host_original, debrid_source)
         state.release_download_slot()
-        state.remove_download(titulo_referencia, nombre_archivo)
-        if os.path.exists(ruta_temp):
-            try: os.remove(ruta_temp)
-            except: pass
-        return None
\ No newline at end of file
+        state.remove_download(titulo_referencia, nombre_mostrado)
+        if reanudable:
+            # Conservamos el .part y su sidecar para continuar en el próximo intento
+            print(f"   [RESUME] Parcial conservado: {os.path.basename(ruta_temp)}")
+        else:
+            _borrar_parcial(ruta_temp)
+        return None
+
+    finally:
+        if control.progreso: limitador.liberar(control.progreso)
\ No newline at end of file
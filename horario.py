@@ -0,0 +1,113 @@
+import os
+import json
+import time
+from datetime import datetime, timedelta
+from threading import Lock
+import config
+
+DIAS_TODOS = [0, 1, 2, 3, 4, 5, 6]  # Lunes = 0 (como datetime.weekday())
+
+def _a_minutos(hhmm):
+    t = config._parse_time(hhmm)
+    if t is None: raise ValueError(f"Hora no válida: {hhmm}")
+    return t.hour * 60 + t.minute
+
+def _validar_regla(regla):
+    dias = regla.get("dias", DIAS_TODOS)
+    if not dias or any(int(d) not in DIAS_TODOS for d in dias):
+        raise ValueError(f"Días no válidos: {dias}")
+    _a_minutos(regla["inicio"])
+    _a_minutos(regla["fin"])
+
+    limite = regla.get("limite_mb")
+    max_paralelo = regla.get("max_paralelo")
+    return {
+        "dias": sorted({int(d) for d in dias}),
+        "inicio": regla["inicio"],
+        "fin": regla["fin"],
+        # None = usar el valor del dashboard
+        "limite_mb": float(limite) if limite is not None else None,
+        "max_paralelo": max(1, int(max_paralelo)) if max_paralelo is not None else None,
+    }
+
+class HorarioSemanal:
+    """
+    Reglas (días, inicio, fin, límite MB/s, máximo en paralelo) evaluadas en
+    orden; gana la primera que cubra el momento actual. Una regla cuyo fin es
+    anterior a su inicio cruza la medianoche (los días son los de inicio).
+
+    El resultado se cachea hasta el siguiente cambio de minuto, así que las
+    consultas por chunk solo comparan un float con time.time().
+    """
+    def __init__(self, ruta):
+        self._lock = Lock()
+        self.ruta = ruta
+        self._reglas = None
+        self._regla_cache = None
+        self._valido_hasta = 0.0
+
+    def _reglas_por_defecto(self):
+        # Equivalente al comportamiento clásico: LIMIT_START_TIME..LIMIT_END_TIME todos los días
+        return [{
+            "dias": DIAS_TODOS,
+            "inicio": config.LIMIT_START_TIME.strftime("%H:%M"),
+            "fin": config.LIMIT_END_TIME.strftime("%H:%M"),
+            "limite_mb": None,
+            "max_paralelo": None,
+        }]
+
+    def _cargar(self):
+        if self._reglas is not None: return
+        self._reglas = self._reglas_por_defecto()
+        try:
+            if os.path.exists(self.ruta):
+                with open(self.ruta, 'r', encoding='utf-8') as f:
+                    self._reglas = [_validar_regla(r) for r in json.load(f)]
+        except Exception as e:
+            print(f"[HORARIO] Error leyendo {self.ruta}, uso el horario por defecto: {e}")
+
+    def obtener_reglas(self):
+        with self._lock:
+            self._cargar()
+            return [dict(r) for r in self._reglas]
+
+    def guardar_reglas(self, reglas):
+        """Valida, persiste y aplica un nuevo horario. Lanza ValueError si no es válido."""
+        validadas = [_validar_regla(r) for r in reglas]
+        with self._lock:
+            with open(self.ruta + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump(validadas, f, indent=1)
+            os.replace(self.ruta + ".tmp", self.ruta)
+            self._reglas = validadas
+            self._valido_hasta = 0.0
+
+    def _evaluar(self, ahora):
+        dia = ahora.weekday()
+        minuto = ahora.hour * 60 + ahora.minute
+        for regla in self._reglas:
+            inicio = _a_minutos(regla["inicio"])
+            fin = _a_minutos(regla["fin"])
+            if inicio < fin:
+                if dia in regla["dias"] and inicio <= minuto < fin:
+                    return regla
+            else:
+                # Cruza la medianoche: tramo de noche del día de inicio + madrugada del siguiente
+                if dia in regla["dias"] and minuto >= inicio:
+                    return regla
+                if (dia - 1) % 7 in regla["dias"] and minuto < fin:
+                    return regla
+        return None
+
+    def regla_actual(self):
+        """Regla vigente o None si ninguna aplica ahora."""
+        if time.time() < self._valido_hasta:
+            return self._regla_cache
+        with self._lock:
+            self._cargar()
+            ahora = datetime.now()
+            self._regla_cache = self._evaluar(ahora)
+            siguiente_minuto = ahora.replace(second=0, microsecond=0) + timedelta(minutes=1)
+            self._valido_hasta = siguiente_minuto.timestamp()
+            return self._regla_cache
+
+horario = HorarioSemanal(config.HORARIO_FILE)
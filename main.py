@@ -1,28 +1,46 @@
 import os
+import sys
 import time
+import signal
 import re
+import queue
 import threading
 import config
 import database as db
 import debrid
 import post_procesado as post
 import scraper 
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from playwright.sync_api import sync_playwright
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from navegador import navegador, filtro
 from web_server import run_web_server
+from rendimiento import tabla as tabla_rendimiento
 from monitor import state
 from urllib.parse import urlparse
 from utils import sanitizar_nombre 
 
-# --- NAVEGADOR (LIMPIO, SIN SESIÓN PREVIA) ---
+# --- NAVEGADOR ---
+
+def _crear_contexto(browser):
+    estado = scraper.sesion.estado_guardado()
+    if estado:
+        try:
+            print("   [NAVEGADOR] Reutilizando sesión guardada...")
+            return browser.new_context(user_agent=config.DEFAULT_USER_AGENT, storage_state=estado)
+        except Exception as e:
+            print(f"   [NAVEGADOR] Sesión guardada ilegible ({e}). Se descarta.")
+            scraper.sesion.borrar()
+    print("   [NAVEGADOR] Iniciando sesión limpia (Incógnito)...")
+    return browser.new_context(user_agent=config.DEFAULT_USER_AGENT)
 
 def obtener_contexto_navegador(browser):
     """
-    Crea un contexto de navegador totalmente nuevo y limpio.
-    No carga cookies ni sesiones anteriores.
+    Contexto con la sesión del foro guardada en el ciclo anterior (si la hay).
+    scraper.ejecutar comprueba si sigue valiendo y solo hace login si no.
+    Lleva instalado el filtro de imágenes, anuncios y scripts de terceros.
     """
-    print("   [NAVEGADOR] Iniciando sesión limpia (Incógnito)...")
-    return browser.new_context(user_agent=config.DEFAULT_USER_AGENT)
+    context = _crear_contexto(browser)
+    filtro.instalar(context, urlparse(scraper.URL_BASE).hostname)
+    return context
 
 # --- UTILIDADES ---
 
@@ -38,88 +56,378 @@ def extraer_numero_parte(filename):
 
 # --- DESCARGA ---
 
+def prioridad_dominio(link):
+    for idx, dom in enumerate(config.PRIORIDAD_DOMINIOS):
+        if dom.lower() in link.lower():
+            return idx
+    return 999
+
+def host_de_enlace(link):
+    try: return urlparse(link).netloc.replace("www.", "")
+    except: return "desconocido"
+
+def coste_enlace(link):
+    """Orden de un enlace aún sin resolver (debrid previsto según HOSTER_PREFS)."""
+    return tabla_rendimiento.coste(host_de_enlace(link), debrid.determinar_debrid(link), prioridad_dominio(link))
+
+def coste_candidato(cand):
+    return tabla_rendimiento.coste(cand["host"], cand["debrid"], cand["prio"])
+
+class CandidatosParte:
+    """
+    Mirrors de una misma parte. Los enlaces del hoster se guardan sin resolver
+    y solo se piden al debrid cuando toca probarlos (primero el mejor según
+    la tabla de rendimiento; el siguiente solo si ese falla). Los enlaces cuyo
+    número de parte no se puede adivinar llegan ya resueltos con agregar().
+
+    También lleva el estado de hedging: descargas en curso de la parte y la
+    ruta de la primera copia que termine.
+    """
+    def __init__(self, num_parte, nombre_guia=None, descarga_id=None, mapa_partes=None):
+        self.num_parte = num_parte
+        self.nombre_guia = nombre_guia
+        self.descarga_id = descarga_id
+        self.mapa_partes = mapa_partes  # {num_parte: CandidatosParte} de la misma descarga
+        self.bolsa = None  # BolsaSinNombre compartida: último recurso si se agotan los mirrors
+        self._cond = threading.Condition()
+        self._pendientes = []
+        self._sin_resolver = []
+        self._cerrado = False
+        self._mejor_coste = float("inf")  # Incluye los mirrors que ya se han sacado para descargar
+
+        self.controles = []
+        self.hedge = None
+        self.ruta = None
+        self.duracion = None
+        self._inicio = None
+
+    def agregar(self, cand):
+        coste = coste_candidato(cand)
+        with self._cond:
+            self._pendientes.append(cand)
+            self._mejor_coste = min(self._mejor_coste, coste)
+            self._cond.notify_all()
+
+    def agregar_enlace(self, link):
+        coste = coste_enlace(link)
+        with self._cond:
+            self._sin_resolver.append(link)
+            self._mejor_coste = min(self._mejor_coste, coste)
+            self._cond.notify_all()
+
+    def cerrar(self):
+        """No van a llegar más mirrors para esta parte."""
+        with self._cond:
+            self._cerrado = True
+            self._cond.notify_all()
+
+    def tiene_alternativas(self):
+        with self._cond:
+            if self._pendientes or self._sin_resolver: return True
+        return bool(self.bolsa and self.bolsa.quedan())
+
+    def mejor_coste(self):
+        """Coste del mejor mirror que ha tenido la parte, esté aún en cola o ya descargándose."""
+        with self._cond:
+            return self._mejor_coste
+
+    def registrar_control(self, control):
+        with self._cond:
+            self.controles.append(control)
+
+    def control_principal(self):
+        """Descarga no especulativa en curso, si la hay."""
+        with self._cond:
+            activos = [c for c in self.controles if not c.hedge and c.inicio and not c.cancelado.is_set()]
+            return activos[-1] if activos else None
+
+    def ganar(self, ruta, control):
+        """La primera copia que termina se queda la parte; las demás se cancelan."""
+        with self._cond:
+            if self.ruta is None:
+                self.ruta = ruta
+                inicios = [c.inicio for c in self.controles if c.inicio]
+                if inicios: self.duracion = time.time() - min(inicios)
+            for c in self.controles:
+                if c is not control: c.cancelar()
+
+    def siguiente(self):
+        """Mejor mirror aún no probado; espera si todavía se están resolviendo."""
+        while True:
+            with self._cond:
+                while not self._pendientes and not self._sin_resolver and not self._cerrado:
+                    self._cond.wait()
+                if not self._pendientes and not self._sin_resolver: break
+
+                # Orden por rendimiento medido, con PRIORIDAD_DOMINIOS como prior
+                mejor = min(self._pendientes, key=coste_candidato) if self._pendientes else None
+                link = min(self._sin_resolver, key=coste_enlace) if self._sin_resolver else None
+                if mejor and (link is None or coste_candidato(mejor) <= coste_enlace(link)):
+                    self._pendientes.remove(mejor)
+                    return mejor
+                self._sin_resolver.remove(link)
+
+            # Resolución bajo demanda (fuera del lock)
+            cand = _resolver_enlace(link, self.descarga_id)
+            if not cand: continue
+            if cand["part_num"] != self.num_parte:
+                # Ya está resuelto (cuota gastada): se le da a la parte a la que pertenece
+                otra = self.mapa_partes.get(cand["part_num"]) if self.mapa_partes else None
+                if otra: otra.agregar(cand)
+                else: print(f"      [WARN] {cand['name']} es una parte desconocida ({cand['part_num']}). Se ignora.")
+                continue
+            return cand
+
+        # Sin mirrors propios: se resuelven enlaces sin nombre hasta dar con esta parte
+        return self.bolsa.buscar(self.num_parte) if self.bolsa else None
+
+class BolsaSinNombre:
+    """
+    Enlaces sin nombre visible (1fichier, mega...) de hosts peor valorados
+    que los mirrors ya agrupados. No se sabe a qué parte pertenecen hasta
+    resolverlos, así que solo se piden al debrid cuando alguna parte se
+    queda sin mirrors; los que salen de otra parte se le entregan a ella.
+    """
+    def __init__(self, links, descarga_id, mapa_partes):
+        self._lock = threading.Lock()
+        self._links = list(links)
+        self.descarga_id = descarga_id
+        self.mapa_partes = mapa_partes
+
+    def quedan(self):
+        with self._lock:
+            return bool(self._links)
+
+    def buscar(self, num_parte):
+        with self._lock:
+            while self._links:
+                link = min(self._links, key=coste_enlace)
+                self._links.remove(link)
+                cand = _resolver_enlace(link, self.descarga_id)
+                if not cand: continue
+                if cand["part_num"] == num_parte: return cand
+                if cand["part_num"] in self.mapa_partes:
+                    self.mapa_partes[cand["part_num"]].agregar(cand)
+                else:
+                    print(f"      [WARN] {cand['name']} es una parte desconocida ({cand['part_num']}). Se ignora.")
+            return None
+
+def _resolver_enlace(link, descarga_id=None):
+    url_prem, nombre_fichero, debrid_used, culpa = debrid.obtener_enlace_premium(link)
+    if not url_prem or not nombre_fichero:
+        # Solo cuenta para 'muerto' si el debrid ha rechazado el propio enlace
+        if culpa == "hoster":
+            db.registrar_resultado_enlace(descarga_id, link, False, "hoster")
+        return None
+    
+    host_clean = host_de_enlace(link)
+    num_parte = extraer_numero_parte(nombre_fichero)
+    db.registrar_enlace_resuelto(descarga_id, link, debrid_used, num_parte)
+    return {
+        "link": link,
+        "url": url_prem, 
+        "name": nombre_fichero, 
+        "prio": prioridad_dominio(link),
+        "host": host_clean, 
+        "debrid": debrid_used,
+        "part_num": num_parte
+    }
+
+def _descargar_candidato(candidatos, cand, carpeta, titulo, fmt, hedge=False):
+    etiqueta = "HEDGE" if hedge else "INTENTO"
+    print(f"      [{etiqueta}] Parte {cand['part_num']} usando {cand['host']} (Prio: {cand['prio']})")
+    control = debrid.ControlDescarga(hedge=hedge)
+    candidatos.registrar_control(control)
+    ruta = debrid.descargar_archivo(
+        cand["url"], 
+        carpeta, 
+        titulo, 
+        host_original=cand["host"], 
+        debrid_source=cand["debrid"],
+        formato_peli=fmt,
+        control=control
+    )
+    if ruta:
+        candidatos.ganar(ruta, control)
+        db.registrar_resultado_enlace(candidatos.descarga_id, cand["link"], True)
+    elif not control.cancelado.is_set():
+        # Una copia cancelada por el hedging no dice nada malo del mirror
+        db.registrar_resultado_enlace(candidatos.descarga_id, cand["link"], False, "descarga")
+    return ruta
+
 def _descargar_parte_wrapper(candidatos, carpeta, titulo, fmt):
-    for cand in candidatos:
-        print(f"      [INTENTO] Parte {cand['part_num']} usando {cand['host']} (Prio: {cand['prio']})")
-        ruta = debrid.descargar_archivo(
-            cand["url"], 
-            carpeta, 
-            titulo, 
-            host_original=cand["host"], 
-            debrid_source=cand["debrid"],
-            formato_peli=fmt
-        )
-        if ruta: return True
-    return False
+    cand = candidatos.siguiente()
+    while cand and not candidatos.ruta:
+        ruta = _descargar_candidato(candidatos, cand, carpeta, titulo, fmt)
+        if ruta: return ruta
+        cand = candidatos.siguiente() if not candidatos.ruta else None
+    # Si había una copia especulativa en marcha, su resultado es el de la parte
+    if candidatos.hedge: candidatos.hedge.result()
+    return candidatos.ruta
+
+def _descargar_hedge(candidatos, carpeta, titulo, fmt):
+    cand = candidatos.siguiente()
+    if not cand or candidatos.ruta: return None
+    return _descargar_candidato(candidatos, cand, carpeta, titulo, fmt, hedge=True)
+
+def _revisar_rezagadas(mapa_partes, hedger, carpeta, titulo, fmt):
+    """
+    Lanza una copia desde otro mirror para las partes cuya llegada prevista
+    queda muy por detrás de lo que tardaron sus hermanas.
+    """
+    duraciones = sorted(c.duracion for c in mapa_partes.values() if c.duracion)
+    if not duraciones or len(duraciones) < config.HEDGE_MIN_FRACCION * len(mapa_partes):
+        return
+    mediana = duraciones[len(duraciones) // 2]
+
+    for candidatos in mapa_partes.values():
+        if candidatos.ruta or candidatos.hedge: continue
+        control = candidatos.control_principal()
+        if not control: continue
+        transcurrido = time.time() - control.inicio
+        restante = control.segundos_restantes()
+        if restante is None or transcurrido < config.HEDGE_MIN_SEGUNDOS: continue
+        if transcurrido + restante <= config.HEDGE_FACTOR * mediana: continue
+        if not candidatos.tiene_alternativas(): continue
+
+        print(f"   [HEDGE] Parte {candidatos.num_parte} rezagada (prevista {int(transcurrido + restante)}s, mediana {int(mediana)}s). Probando otro mirror...")
+        candidatos.hedge = hedger.submit(_descargar_hedge, candidatos, carpeta, titulo, fmt)
 
 def intentar_descarga(variante, titulo):
     fmt = variante["formato"]
-    raw_links = [l.strip() for l in variante["enlaces"].split('\n') if l.strip()]
+    raw_links = [e["url"] for e in variante["enlaces"]]
+    descarga_id = variante["id"]
     titulo_orig = variante["titulo_orig"]
     
     if not raw_links: return False
     
     print(f"   [ANÁLISIS] Resolviendo {len(raw_links)} enlaces para {fmt}...")
-    
-    mapa_partes = {}
-    for link in raw_links:
-        url_prem, nombre_fichero, debrid_used = debrid.obtener_enlace_premium(link)
-        if not url_prem or not nombre_fichero: continue
-        
-        try:
-            parsed = urlparse(link)
-            host_clean = parsed.netloc.replace("www.", "")
-        except: host_clean = "desconocido"
-
-        num_parte = extraer_numero_parte(nombre_fichero)
-        
-        prioridad = 999
-        for idx, dom in enumerate(config.PRIORIDAD_DOMINIOS):
-            if dom.lower() in link.lower():
-                prioridad = idx
-                break
-        
-        if num_parte not in mapa_partes: mapa_partes[num_parte] = []
-        mapa_partes[num_parte].append({
-            "url": url_prem, 
-            "name": nombre_fichero, 
-            "prio": prioridad,
-            "host": host_clean, 
-            "debrid": debrid_used,
-            "part_num": num_parte
-        })
-
-    if not mapa_partes: return False
 
     titulo_limpio = sanitizar_nombre(titulo)
     carpeta = os.path.join(config.DOWNLOAD_DIR, f"{titulo_limpio} [{fmt}]")
     if not os.path.exists(carpeta): os.makedirs(carpeta)
-    
-    total_partes = len(mapa_partes)
+
+    mapa_partes = {}
+    futures = {}
+    extractor = None
     partes_exitosas = 0
-    
-    print(f"   [LANZAMIENTO] Descarga paralela ({total_partes} partes) para: {titulo_limpio}")
-    state.init_movie(titulo, total_partes)
-
-    with ThreadPoolExecutor(max_workers=len(mapa_partes) + 2) as executor:
-        futures = []
-        for num_parte in mapa_partes:
-            candidatos_ordenados = sorted(mapa_partes[num_parte], key=lambda x: x["prio"])
-            futures.append(executor.submit(_descargar_parte_wrapper, candidatos_ordenados, carpeta, titulo, fmt))
-        
-        for future in as_completed(futures):
-            if future.result(): partes_exitosas += 1
-
-    if partes_exitosas == total_partes:
-        print(f"   [POST] Descarga de [{fmt}] completa. Iniciando extracción INMEDIATA...")
-        state.update_extraction(titulo, 0)
-        res = post.procesar_carpeta_final(carpeta, titulo, fmt, titulo_orig)
-        state.purge_movie(titulo)
-        return res
-    else:
-        print(f"   [ERROR] Incompleto: {partes_exitosas}/{total_partes} partes.")
-        state.purge_movie(titulo)
-        return False
+
+    # Agrupamos por el número de parte que se lee en la URL del hoster o que quedó
+    # guardado al resolver el enlace en otro ciclo. El resto no tiene nombre visible.
+    sin_adivinar = []
+    for enlace in variante["enlaces"]:
+        link = enlace["url"]
+        nombre = debrid.adivinar_nombre_fichero(link)
+        num_parte = extraer_numero_parte(nombre) if nombre else enlace.get("num_parte")
+        if num_parte is None:
+            sin_adivinar.append(link)
+            continue
+        if num_parte not in mapa_partes:
+            mapa_partes[num_parte] = CandidatosParte(num_parte, nombre, descarga_id, mapa_partes)
+        elif nombre and not mapa_partes[num_parte].nombre_guia:
+            mapa_partes[num_parte].nombre_guia = nombre
+        mapa_partes[num_parte].agregar_enlace(link)
+
+    if mapa_partes:
+        print(f"   [LAZY] {len(raw_links) - len(sin_adivinar)} mirrors agrupados en {len(mapa_partes)} partes. Se resuelve solo el mejor de cada una.")
+
+    # No hace falta un hilo por parte: como mucho se descargan 'max_parallel'
+    # archivos a la vez, el resto espera en la cola del executor sin ocupar hilo.
+    hilos_partes = max(1, state.get_max_parallel())
+    try:
+        with ThreadPoolExecutor(max_workers=config.UNRESTRICT_WORKERS) as resolutor, \
+             ThreadPoolExecutor(max_workers=hilos_partes) as executor, \
+             ThreadPoolExecutor(max_workers=max(1, config.HEDGE_MAX_PARALELAS)) as hedger:
+
+            lanzadas = set()
+
+            def lanzar_parte(num_parte):
+                nonlocal extractor
+                lanzadas.add(num_parte)
+                futures[executor.submit(_descargar_parte_wrapper, mapa_partes[num_parte], carpeta, titulo, fmt)] = num_parte
+                state.init_movie(titulo, len(mapa_partes))
+                # Extracción en streaming: solo para sets .partN.rar
+                if config.UNRAR_STREAMING and num_parte == 1 and mapa_partes[1].nombre_guia \
+                        and post.es_primer_volumen(mapa_partes[1].nombre_guia):
+                    extractor = post.ExtraccionEnStreaming(carpeta)
+
+            def lanzar_hasta(coste):
+                """Arranca las partes cuyo mejor mirror no es peor que coste."""
+                for num_parte in sorted(set(mapa_partes) - lanzadas):
+                    if mapa_partes[num_parte].mejor_coste() <= coste: lanzar_parte(num_parte)
+
+            # Enlaces sin nombre, por host y del mejor al peor. Un host se resuelve
+            # (entero: hace falta para saber sus partes) solo si mejora el mirror
+            # de alguna parte; los demás quedan en la bolsa, sin gastar cuota.
+            # Ninguna parte arranca mientras se resuelve un host mejor que su mejor
+            # mirror, pero cada parte arranca con el primer resultado que le llega.
+            por_host = {}
+            for link in sin_adivinar:
+                por_host.setdefault(host_de_enlace(link), []).append(link)
+            en_bolsa = []
+            for host, links in sorted(por_host.items(), key=lambda item: coste_enlace(item[1][0])):
+                coste_host = coste_enlace(links[0])
+                peor_parte = max((c.mejor_coste() for c in mapa_partes.values()), default=float("inf"))
+                if coste_host >= peor_parte:
+                    en_bolsa.extend(links)
+                    continue
+                lanzar_hasta(coste_host)
+                print(f"   [ANÁLISIS] Resolviendo {len(links)} enlaces sin nombre de {host}...")
+                # Los límites por proveedor (concurrencia y peticiones/minuto) están en debrid
+                for fut in as_completed([resolutor.submit(_resolver_enlace, link, descarga_id) for link in links]):
+                    cand = fut.result()
+                    if not cand: continue
+                    num_parte = cand["part_num"]
+                    if num_parte not in mapa_partes:
+                        mapa_partes[num_parte] = CandidatosParte(num_parte, cand["name"], descarga_id, mapa_partes)
+                    elif not mapa_partes[num_parte].nombre_guia:
+                        mapa_partes[num_parte].nombre_guia = cand["name"]
+                    mapa_partes[num_parte].agregar(cand)
+                    # Los hosts que quedan son peores: la parte ya tiene su mejor mirror
+                    if num_parte not in lanzadas: lanzar_parte(num_parte)
+
+            bolsa = BolsaSinNombre(en_bolsa, descarga_id, mapa_partes) if en_bolsa else None
+            if bolsa:
+                print(f"   [LAZY] {len(en_bolsa)} enlaces sin nombre en reserva (solo se resuelven si hacen falta).")
+            for candidatos in mapa_partes.values():
+                candidatos.bolsa = bolsa
+                candidatos.cerrar()
+            lanzar_hasta(float("inf"))
+
+            total_partes = len(mapa_partes)
+            if extractor: extractor.fijar_total(total_partes)
+            if total_partes:
+                print(f"   [LANZAMIENTO] Descarga paralela ({total_partes} partes) para: {titulo_limpio}")
+
+            en_curso = set(futures)
+            while en_curso:
+                terminados, en_curso = wait(en_curso, timeout=config.HEDGE_INTERVALO, return_when=FIRST_COMPLETED)
+                for future in terminados:
+                    ruta = future.result()
+                    if ruta:
+                        partes_exitosas += 1
+                        if extractor: extractor.volumen_listo(futures[future], ruta)
+                if config.HEDGE_ACTIVO and en_curso:
+                    _revisar_rezagadas(mapa_partes, hedger, carpeta, titulo, fmt)
+
+        if not mapa_partes: return False
+
+        if partes_exitosas == total_partes:
+            ya_extraido = extractor.esperar() if extractor else False
+            extractor = None  # unrar ya ha terminado: nada que abortar
+            print(f"   [POST] Descarga de [{fmt}] completa. Iniciando extracción INMEDIATA...")
+            state.update_extraction(titulo, 0)
+            res = post.procesar_carpeta_final(carpeta, titulo, fmt, titulo_orig, ya_extraido=ya_extraido)
+            state.purge_movie(titulo)
+            return res
+        else:
+            print(f"   [ERROR] Incompleto: {partes_exitosas}/{total_partes} partes.")
+            state.purge_movie(titulo)
+            return False
+    finally:
+        # Incompleto o una excepción a medias (future.result(), hedge...): sin
+        # esto 'unrar -vp' se queda en pausa para siempre esperando un volumen
+        if extractor: extractor.abortar()
 
 # --- WORKERS ---
 
@@ -151,14 +459,76 @@ def worker_descarga_pelicula(pid, datos_peli):
 
     print(f"[Worker {pid}] 🏁 Finalizado flujo para: {titulo}")
 
+def agrupar_pendientes(pendientes):
+    data_map = {}
+    for d in pendientes:
+        pid = d["pid"]
+        if pid not in data_map: 
+            data_map[pid] = {"titulo": d["titulo"], "variantes": []}
+        data_map[pid]["variantes"].append({
+            "id": d["id"], "formato": d["formato"], "enlaces": d["enlaces"], "titulo_orig": d["titulo_orig"]
+        })
+    return data_map
+
+class GestorDescargas:
+    """
+    Pool fijo de MAX_WORKERS hilos que consumen una cola de películas (por
+    pelicula_id). El scraper encola en cuanto guarda enlaces nuevos y el
+    barrido de pendientes de cada ciclo rellena lo que falte, así que el
+    scraping del siguiente ciclo no espera a que se vacíen las descargas.
+    """
+    def __init__(self, num_workers):
+        self._cola = queue.Queue()
+        self._lock = threading.Lock()
+        self._en_curso = set()
+        for i in range(num_workers):
+            threading.Thread(target=self._bucle, name=f"worker-{i}", daemon=True).start()
+
+    def encolar(self, pid):
+        """Añade la película si no está ya en cola o descargándose."""
+        with self._lock:
+            if pid in self._en_curso: return False
+            self._en_curso.add(pid)
+        self._cola.put(pid)
+        return True
+
+    def _bucle(self):
+        while True:
+            pid = self._cola.get()
+            try:
+                # Datos frescos de la DB: pueden haber llegado variantes nuevas
+                with db.conexion() as conn:
+                    cur = conn.cursor()
+                    pendientes = db.obtener_pendientes_pelicula(cur, pid)
+                    cur.close()
+                datos = agrupar_pendientes(pendientes).get(pid)
+                if datos:
+                    print(f"[Gestor] Iniciando: {datos['titulo']}")
+                    worker_wrapper(pid, datos)
+            except Exception as e:
+                print(f"[Gestor] Error con película {pid}: {e}")
+            finally:
+                with self._lock:
+                    self._en_curso.discard(pid)
+                self._cola.task_done()
+
+gestor = None
+
+def obtener_gestor():
+    global gestor
+    if gestor is None:
+        gestor = GestorDescargas(config.MAX_WORKERS)
+    return gestor
+
 # --- MAIN LOOP ---
 
 def flujo_descargas(context):
+    gestor = obtener_gestor()
     
     print("\n[*] --- FASE 1: SCRAPING Y REPARACIÓN ---")
     try:
-        # Ya no hay guardado de sesión, solo ejecución directa
-        scraper.ejecutar(context) 
+        # Cada película con enlaces nuevos entra en la cola al momento
+        scraper.ejecutar(context, al_encontrar=gestor.encolar) 
     except Exception as e:
         print(f"[!] Error Scraper: {e}")
 
@@ -172,62 +542,40 @@ def flujo_descargas(context):
     state.set_detected_movies(det)
 
     print("[*] --- FASE 2: GESTOR DE DESCARGAS ---")
-    conn = db.get_connection()
-    cur = conn.cursor()
-    pendientes = db.obtener_pendientes(cur)
-    cur.close()
-    conn.close()
+    with db.conexion() as conn:
+        cur = conn.cursor()
+        pendientes = db.obtener_pendientes(cur)
+        cur.close()
 
     if not pendientes:
         print("[*] No hay descargas listas (con enlaces).")
         return
 
-    data_map = {}
-    for r in pendientes:
-        did, pid, tit, fmt, lnk, torig = r
-        if pid not in data_map: 
-            data_map[pid] = {"titulo": tit, "variantes": []}
-        data_map[pid]["variantes"].append({
-            "id": did, "formato": fmt, "enlaces": lnk, "titulo_orig": torig
-        })
-    
-    cola_de_trabajo = list(data_map.items())
-    hilos_activos = []
-
-    print(f"[*] Procesando {len(cola_de_trabajo)} películas...")
-
-    while cola_de_trabajo or hilos_activos:
-        hilos_activos = [t for t in hilos_activos if t.is_alive()]
-        
-        while len(hilos_activos) < config.MAX_WORKERS and cola_de_trabajo:
-            pid, datos = cola_de_trabajo.pop(0)
-            print(f"[Gestor] Iniciando: {datos['titulo']}")
-            t = threading.Thread(target=worker_wrapper, args=(pid, datos)) 
-            t.daemon = True
-            t.start()
-            hilos_activos.append(t)
-            
-        time.sleep(2)
+    nuevas = sum(1 for pid in agrupar_pendientes(pendientes) if gestor.encolar(pid))
+    print(f"[*] {nuevas} películas nuevas en cola (las demás ya estaban en marcha).")
 
 def main():
     db.init_db()
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True) 
-        # Contexto siempre limpio
-        context = obtener_contexto_navegador(browser)
+    # Chromium sigue vivo entre ciclos; cada ciclo usa un contexto nuevo
+    with navegador.contexto(obtener_contexto_navegador) as context:
         flujo_descargas(context)
-        # Eliminado guardar_sesion(context) al final
-        browser.close()
 
 if __name__ == "__main__":
     print("[SYSTEM] Servidor web en puerto 8000...")
     t_web = threading.Thread(target=run_web_server, daemon=True)
     t_web.start()
     
-    while True:
-        try: main()
-        except Exception as e:
-            print(f"[CRASH] Error principal: {e}")
-            time.sleep(30)
-        print(f"[*] Durmiendo {config.CHECK_INTERVAL} segundos...")
-        time.sleep(config.CHECK_INTERVAL)
\ No newline at end of file
+    # docker stop manda SIGTERM: como SystemExit, el finally llega a cerrar Chromium
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    try:
+        while True:
+            try: main()
+            except Exception as e:
+                print(f"[CRASH] Error principal: {e}")
+                time.sleep(30)
+            print(f"[*] Durmiendo {config.CHECK_INTERVAL} segundos...")
+            time.sleep(config.CHECK_INTERVAL)
+    finally:
+        # Playwright síncrono: se cierra desde este mismo hilo, el que lo arrancó
+        print("[SYSTEM] Cerrando navegador...")
+        navegador.cerrar()
\ No newline at end of file
@@ -1,6 +1,89 @@
 import time
-from threading import Lock, Condition
+import itertools
+from threading import Lock, Event
 import config 
+from horario import horario
+
+class _Espera:
+    __slots__ = ("pelicula", "formato", "seq", "evento")
+
+    def __init__(self, pelicula, formato, seq):
+        self.pelicula = pelicula
+        self.formato = formato
+        self.seq = seq
+        self.evento = Event()
+
+class PlanificadorDescargas:
+    """
+    Reparte los slots de descarga entre los archivos en espera. Al liberarse
+    un slot solo se despierta al elegido (sin notify_all), y el orden es:
+    empujones manuales del dashboard, película más cerca de terminar,
+    prioridad de formato (PRIORIDAD_FORMATOS) y orden de llegada.
+    """
+    def __init__(self, max_paralelo, progreso_pelicula):
+        self._lock = Lock()
+        self._esperando = []
+        self._activos = 0
+        self._seq = itertools.count()
+        self._max_paralelo = max_paralelo
+        self._progreso_pelicula = progreso_pelicula
+        self.empujones = {}
+
+    def _clave(self, espera):
+        empujon = -self.empujones.get(espera.pelicula, 0)
+        if config.MODO_PLANIFICADOR == "fifo":
+            return (empujon, espera.seq)
+        try: orden_fmt = config.PRIORIDAD_FORMATOS.index(espera.formato)
+        except ValueError: orden_fmt = len(config.PRIORIDAD_FORMATOS)
+        return (empujon, -self._progreso_pelicula(espera.pelicula), orden_fmt, espera.seq)
+
+    def _repartir(self):
+        # Llamar con self._lock tomado
+        while self._esperando and self._activos < self._max_paralelo():
+            elegido = min(self._esperando, key=self._clave)
+            self._esperando.remove(elegido)
+            self._activos += 1
+            elegido.evento.set()
+
+    def adquirir(self, pelicula=None, formato=None):
+        with self._lock:
+            if not self._esperando and self._activos < self._max_paralelo():
+                self._activos += 1
+                return
+            espera = _Espera(pelicula, formato, next(self._seq))
+            self._esperando.append(espera)
+        # Timeout para notar los cambios de franja del horario
+        while not espera.evento.wait(timeout=30):
+            self.revisar()
+
+    def liberar(self):
+        with self._lock:
+            if self._activos > 0:
+                self._activos -= 1
+            self._repartir()
+
+    def revisar(self):
+        """Reparte slots libres (p.ej. tras subir max_parallel)."""
+        with self._lock:
+            self._repartir()
+
+    def empujar(self, pelicula, delta):
+        with self._lock:
+            valor = self.empujones.get(pelicula, 0) + int(delta)
+            if valor: self.empujones[pelicula] = valor
+            else: self.empujones.pop(pelicula, None)
+
+    def olvidar(self, pelicula):
+        with self._lock:
+            self.empujones.pop(pelicula, None)
+
+    def empujones_actuales(self):
+        with self._lock:
+            return dict(self.empujones)
+
+    def en_espera(self):
+        with self._lock:
+            return len(self._esperando)
 
 class DownloadMonitor:
     def __init__(self):
@@ -15,10 +98,12 @@ class DownloadMonitor:
         
         # Gestión de Novedades Detectadas
         self.detected_movies = [] 
+
+        # Estado del Chromium persistente (navegador.py)
+        self.browser_stats = {}
         
         # Gestión de Slots
-        self.download_condition = Condition()
-        self.current_downloading_files = 0
+        self.planificador = PlanificadorDescargas(self._max_parallel_vigente, self.movie_progress)
         
         # DEBUG: Log para ver qué configuración está cargando realmente
         print(f"[MONITOR] Configuración cargada: Max Parallel={config.MAX_WORKERS}, Limit Enabled={config.ENABLE_SPEED_LIMIT}")
@@ -39,24 +124,45 @@ class DownloadMonitor:
         with self._lock:
             self.detected_movies = movies_list
 
+    def set_browser_stats(self, stats):
+        with self._lock:
+            self.browser_stats = stats
+
     # --- GESTIÓN DE ESTADO FINAL ---
     def mark_completed(self, titulo, formato=None):
         with self._lock:
             key = f"{titulo} [{formato}]" if formato else titulo
             self.completed_titles.add(key)
 
-    # --- SEMÁFORO ---
-    def acquire_download_slot(self):
-        with self.download_condition:
-            while self.current_downloading_files >= self.dynamic_config["max_parallel"]:
-                self.download_condition.wait()
-            self.current_downloading_files += 1
+    # --- SLOTS (PLANIFICADOR) ---
+    def _max_parallel_vigente(self):
+        regla = horario.regla_actual()
+        if regla and regla["max_paralelo"] is not None:
+            return regla["max_paralelo"]
+        return self.dynamic_config["max_parallel"]
+
+    def movie_progress(self, pelicula):
+        """Fracción descargada de una película (0..1) según las partes conocidas."""
+        with self._lock:
+            archivos = self.active_downloads.get(pelicula)
+            if not archivos: return 0.0
+            total = archivos.get("__meta__", {}).get("total_parts", 0)
+            if total <= 0: return 0.0
+            hecho = 0.0
+            for key, datos in archivos.items():
+                if key == "__meta__": continue
+                if datos.get("status") == "completed": hecho += 1
+                elif datos.get("status") == "downloading": hecho += datos.get("progress", 0) / 100
+            return min(hecho / total, 1.0)
+
+    def acquire_download_slot(self, pelicula=None, formato=None):
+        self.planificador.adquirir(pelicula, formato)
 
     def release_download_slot(self):
-        with self.download_condition:
-            if self.current_downloading_files > 0:
-                self.current_downloading_files -= 1
-            self.download_condition.notify_all()
+        self.planificador.liberar()
+
+    def bump_priority(self, pelicula, delta=1):
+        self.planificador.empujar(pelicula, delta)
 
     # --- UPDATE ---
     def update_download(self, pelicula, archivo, leido_bytes, total_bytes, velocidad_mb, host=None, debrid=None, formato=None):
@@ -117,6 +223,7 @@ class DownloadMonitor:
             self._recalculate_total_speed()
 
     def purge_movie(self, pelicula):
+        self.planificador.olvidar(pelicula)
         with self._lock:
             if pelicula in self.active_downloads:
                 del self.active_downloads[pelicula]
@@ -156,9 +263,11 @@ class DownloadMonitor:
         with self._lock:
             if titulo not in self.active_downloads:
                 self.active_downloads[titulo] = {}
+            # Puede llamarse varias veces mientras se descubren partes
+            meta_previa = self.active_downloads[titulo].get("__meta__", {})
             self.active_downloads[titulo]["__meta__"] = {
                 "total_parts": total_parts,
-                "created_at": time.time()
+                "created_at": meta_previa.get("created_at", time.time())
             }
 
     def _recalculate_total_speed(self):
@@ -178,17 +287,20 @@ class DownloadMonitor:
         config.SPEED_LIMIT_MB = float(limit_mb)
 
     def set_max_parallel(self, n):
-        with self.download_condition:
+        with self._lock:
             val = int(n)
             if val < 1: val = 1
             self.dynamic_config["max_parallel"] = val
-            self.download_condition.notify_all()
+        self.planificador.revisar()
 
     def get_max_parallel(self):
         with self._lock:
             return self.dynamic_config["max_parallel"]
 
     def get_status(self):
+        # Fuera de self._lock: el planificador toma su lock y luego el nuestro
+        prioridades = self.planificador.empujones_actuales()
+        en_cola = self.planificador.en_espera()
         with self._lock:
             return {
                 "downloads": self.active_downloads,
@@ -197,7 +309,11 @@ class DownloadMonitor:
                 "config": self.dynamic_config,
                 "completed": list(self.completed_titles),
                 "formats": self.movie_formats,
-                "detected": self.detected_movies 
+                "detected": self.detected_movies,
+                "schedule": horario.regla_actual(),
+                "priorities": prioridades,
+                "queued_files": en_cola,
+                "browser": self.browser_stats
             }
 
 state = DownloadMonitor()
\ No newline at end of file
@@ -0,0 +1,61 @@
+import asyncio
+import threading
+import config
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+class MotorAsync:
+    """
+    Un único event loop (en su propio hilo) con un cliente httpx compartido.
+    El resto del bot sigue siendo síncrono: cada llamada se envía al loop con
+    ejecutar() y el hilo que la hace espera el resultado. Así los segmentos
+    de descarga y las llamadas a la API son corrutinas, no hilos del sistema.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self.cliente = None
+
+    def disponible(self):
+        return config.ASYNC_ENGINE and httpx is not None
+
+    def _arrancar(self):
+        with self._lock:
+            if self._loop: return
+            loop = asyncio.new_event_loop()
+            listo = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                listo.set()
+                loop.run_forever()
+
+            threading.Thread(target=run, daemon=True, name="motor-async").start()
+            listo.wait()
+
+            async def crear_cliente():
+                # El pool limita las conexiones simultáneas; pool=None hace que
+                # las peticiones de más esperen turno en vez de fallar.
+                limites = httpx.Limits(
+                    max_connections=config.ASYNC_MAX_CONEXIONES,
+                    max_keepalive_connections=config.ASYNC_MAX_CONEXIONES
+                )
+                timeout = httpx.Timeout(60.0, pool=None)
+                # Mismos reintentos de conexión que la sesión síncrona (sesion_http)
+                transporte = httpx.AsyncHTTPTransport(limits=limites, retries=config.HTTP_REINTENTOS)
+                return httpx.AsyncClient(transport=transporte, timeout=timeout, follow_redirects=True,
+                                         headers={"User-Agent": config.DEFAULT_USER_AGENT})
+
+            self.cliente = asyncio.run_coroutine_threadsafe(crear_cliente(), loop).result()
+            self._loop = loop
+            print(f"[MOTOR] Event loop asíncrono iniciado (máx. {config.ASYNC_MAX_CONEXIONES} conexiones)")
+
+    def ejecutar(self, coro):
+        """Ejecuta la corrutina en el loop compartido y bloquea hasta su resultado."""
+        self._arrancar()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+motor = MotorAsync()
@@ -0,0 +1,189 @@
+import os
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from playwright.sync_api import sync_playwright
+import config
+from monitor import state
+
+def _memoria_navegador_mb():
+    """
+    RSS (MB) del driver de Playwright y todo lo que cuelga de él (Chromium).
+    Solo se cuentan los hijos de este proceso cuyo cmdline es el driver: los
+    unrar/mkvmerge del extractor también son hijos nuestros y no deben sumar.
+    """
+    hijos = {}
+    for entrada in os.listdir("/proc"):
+        if not entrada.isdigit(): continue
+        try:
+            with open(f"/proc/{entrada}/stat", 'r') as f:
+                # El nombre va entre paréntesis y puede tener espacios: el ppid va después del ')'
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            hijos.setdefault(ppid, []).append(int(entrada))
+        except (OSError, ValueError, IndexError):
+            continue
+
+    pendientes = []
+    for pid in hijos.get(os.getpid(), []):
+        try:
+            with open(f"/proc/{pid}/cmdline", 'rb') as f:
+                if b"playwright" in f.read(): pendientes.append(pid)
+        except OSError:
+            continue
+
+    total_kb = 0
+    while pendientes:
+        pid = pendientes.pop()
+        pendientes.extend(hijos.get(pid, []))
+        try:
+            with open(f"/proc/{pid}/status", 'r') as f:
+                for linea in f:
+                    if linea.startswith("VmRSS:"):
+                        total_kb += int(linea.split()[1])
+                        break
+        except OSError:
+            continue
+    return total_kb / 1024
+
+def _dominio_en(host, dominios):
+    return any(host == d or host.endswith("." + d) for d in dominios)
+
+class FiltroPeticiones:
+    """
+    Route sobre el contexto que aborta lo que el scraper no necesita para
+    leer li.threadbit y div.postcontent: tipos de recurso (imágenes, fuentes,
+    vídeo), dominios de anuncios y scripts de terceros. El CSS se deja pasar:
+    la visibilidad de los hilos depende de él. Cloudflare
+    (challenges.cloudflare.com y /cdn-cgi/) pasa siempre; durante el login
+    se usa el modo relajado, en el que solo se cortan los anuncios.
+    """
+    def __init__(self):
+        self.relajado = False
+        self.dominio_propio = None
+        self.bloqueadas = 0
+
+    def instalar(self, context, dominio_propio):
+        if not config.FILTRO_ACTIVO: return
+        self.dominio_propio = dominio_propio
+        context.route("**/*", self._manejar)
+
+    @contextmanager
+    def modo_relajado(self):
+        self.relajado = True
+        try: yield
+        finally: self.relajado = False
+
+    def _bloquear(self, peticion):
+        url = peticion.url
+        host = (urlparse(url).hostname or "").lower()
+        if "/cdn-cgi/" in url or _dominio_en(host, config.FILTRO_PERMITIDOS): return False
+        if _dominio_en(host, config.FILTRO_DOMINIOS): return True
+        if self.relajado: return False
+        tipo = peticion.resource_type
+        if tipo in config.FILTRO_TIPOS: return True
+        if tipo == "script" and config.FILTRO_SCRIPTS_TERCEROS and self.dominio_propio:
+            return not _dominio_en(host, [self.dominio_propio])
+        return False
+
+    def _manejar(self, route):
+        try:
+            if self._bloquear(route.request):
+                self.bloqueadas += 1
+                route.abort()
+            else:
+                route.continue_()
+        except Exception:
+            # La página puede haberse cerrado mientras tanto
+            pass
+
+filtro = FiltroPeticiones()
+
+class GestorNavegador:
+    """
+    Un único Chromium vivo entre ciclos. Cada ciclo recibe un contexto nuevo
+    (la sesión del foro la conserva scraper.sesion en disco) que se cierra
+    al terminar. El navegador solo se relanza si se ha caído, si lleva más
+    de NAVEGADOR_MAX_HORAS abierto o si sus procesos superan NAVEGADOR_MAX_MB.
+
+    Playwright síncrono está atado al hilo que lo arranca: usar siempre
+    desde el bucle principal.
+    """
+    def __init__(self):
+        self._playwright = None
+        self._browser = None
+        self._inicio = 0.0
+        self.arranques = 0
+        self.reciclajes = 0
+        self.ultimo_motivo = None
+
+    def _publicar(self):
+        vivo = self._browser is not None and self._browser.is_connected()
+        state.set_browser_stats({
+            "launches": self.arranques,
+            "recycles": self.reciclajes,
+            "uptime_min": int((time.time() - self._inicio) / 60) if vivo else 0,
+            "memory_mb": round(_memoria_navegador_mb()) if vivo else 0,
+            "last_restart_reason": self.ultimo_motivo,
+            "blocked_requests": filtro.bloqueadas,
+        })
+
+    def _motivo_reinicio(self):
+        if self._browser is None: return "arranque"
+        if not self._browser.is_connected(): return "caída"
+        if config.NAVEGADOR_MAX_HORAS > 0 and time.time() - self._inicio > config.NAVEGADOR_MAX_HORAS * 3600:
+            return "antigüedad"
+        if config.NAVEGADOR_MAX_MB > 0 and _memoria_navegador_mb() > config.NAVEGADOR_MAX_MB:
+            return "memoria"
+        return None
+
+    def _cerrar_navegador(self):
+        try:
+            if self._browser and self._browser.is_connected(): self._browser.close()
+        except Exception: pass
+        self._browser = None
+        try:
+            if self._playwright: self._playwright.stop()
+        except Exception: pass
+        self._playwright = None
+
+    def _asegurar_navegador(self):
+        motivo = self._motivo_reinicio()
+        if not motivo: return
+        if self._browser is not None:
+            print(f"   [NAVEGADOR] Reiniciando Chromium ({motivo})...")
+            self._cerrar_navegador()
+        try:
+            self._playwright = sync_playwright().start()
+            self._browser = self._playwright.chromium.launch(headless=True)
+        except Exception:
+            # Sin esto el driver de Playwright queda vivo si falla el launch
+            self._cerrar_navegador()
+            raise
+        self._inicio = time.time()
+        self.arranques += 1
+        self.ultimo_motivo = motivo
+        print(f"   [NAVEGADOR] Chromium iniciado (arranque #{self.arranques}).")
+
+    @contextmanager
+    def contexto(self, crear):
+        """
+        Presta un contexto creado con crear(browser) y lo cierra al salir:
+
+            with navegador.contexto(obtener_contexto_navegador) as context:
+                ...
+        """
+        self._asegurar_navegador()
+        context = crear(self._browser)
+        try:
+            yield context
+        finally:
+            try: context.close()
+            except Exception: pass
+            self.reciclajes += 1
+            self._publicar()
+
+    def cerrar(self):
+        self._cerrar_navegador()
+        self._publicar()
+
+navegador = GestorNavegador()
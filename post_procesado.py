@@ -1,6 +1,8 @@
 import os
 import shutil
+import re
 import subprocess
+import threading
 import config
 from utils import sanitizar_nombre
 from pymediainfo import MediaInfo
@@ -31,6 +33,99 @@ def extraer_rar(ruta_rar, destino):
         print(f"      [EXCEPCIÓN UNRAR] {e}")
         return False
 
+def es_primer_volumen(nombre_archivo):
+    """True si el nombre es el primer volumen de un RAR multiparte (x.part1.rar, x.part01.rar...)."""
+    return re.search(r'\.part0*1\.rar$', nombre_archivo.lower()) is not None
+
+class ExtraccionEnStreaming:
+    """
+    Extrae un RAR multivolumen mientras el resto de partes se sigue descargando.
+    Lanza 'unrar' con -vp (pausa antes de cada volumen) en cuanto llega la parte 1
+    y solo le da paso al siguiente volumen cuando ya está en disco.
+    """
+    def __init__(self, carpeta_destino, total_volumenes=None):
+        self.carpeta_destino = carpeta_destino
+        # Puede no conocerse aún si los enlaces se siguen resolviendo (ver fijar_total)
+        self.total_volumenes = total_volumenes
+        self._volumenes = {}
+        self._cond = threading.Condition()
+        self._abortado = False
+        self._descarga_terminada = False
+        self._hilo = None
+        self.resultado = False
+
+    def fijar_total(self, total_volumenes):
+        with self._cond:
+            self.total_volumenes = total_volumenes
+            self._cond.notify_all()
+
+    def _sin_mas_volumenes(self, num):
+        return self.total_volumenes is not None and num > self.total_volumenes
+
+    def volumen_listo(self, num_parte, ruta):
+        with self._cond:
+            self._volumenes[num_parte] = ruta
+            self._cond.notify_all()
+            if num_parte == 1 and self._hilo is None and es_primer_volumen(os.path.basename(ruta)):
+                self._hilo = threading.Thread(target=self._ejecutar, args=(ruta,), daemon=True)
+                self._hilo.start()
+
+    def abortar(self):
+        with self._cond:
+            self._abortado = True
+            self._cond.notify_all()
+        if self._hilo: self._hilo.join()
+
+    def esperar(self):
+        """Espera a que unrar termine. Retorna True si la extracción fue completa."""
+        if not self._hilo: return False
+        with self._cond:
+            self._descarga_terminada = True
+            self._cond.notify_all()
+        self._hilo.join()
+        return self.resultado
+
+    def _ejecutar(self, ruta_rar):
+        print(f"      [UNRAR] Extracción en streaming desde: {os.path.basename(ruta_rar)}")
+        cmd = ["unrar", "x", "-o+", "-vp", f"-p{config.RAR_PASSWORD}", ruta_rar, self.carpeta_destino + os.sep]
+        try:
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except Exception as e:
+            print(f"      [EXCEPCIÓN UNRAR] {e}")
+            return
+
+        try:
+            siguiente = 2
+            while True:
+                with self._cond:
+                    while (siguiente not in self._volumenes and not self._abortado and not self._descarga_terminada
+                           and not self._sin_mas_volumenes(siguiente) and proc.poll() is None):
+                        self._cond.wait(timeout=5)
+                    if self._abortado:
+                        proc.kill()
+                        proc.wait()
+                        return
+                    if proc.poll() is not None or self._sin_mas_volumenes(siguiente): break
+                    if siguiente not in self._volumenes:
+                        # Falta un volumen que ya no va a llegar
+                        proc.kill()
+                        proc.wait()
+                        return
+                # Respuesta a "[C]ontinue, [Q]uit" de -vp
+                proc.stdin.write(b"C\n")
+                proc.stdin.flush()
+                siguiente += 1
+        except (BrokenPipeError, OSError):
+            pass
+
+        try: proc.stdin.close()
+        except: pass
+        _, err = proc.communicate()
+        if proc.returncode == 0:
+            self.resultado = True
+        else:
+            print(f"      [ERROR UNRAR] Streaming falló (código {proc.returncode}): {err.decode('utf-8', 'ignore')[-300:]}")
+
 def buscar_video_principal(carpeta):
     """
     Busca el archivo de video más grande dentro de la carpeta (recursivo).
@@ -120,9 +215,9 @@ def analizar_video_tecnico(ruta_video):
         
     return codec_tag, hdr_tag
 
-def procesar_carpeta_final(carpeta_destino, titulo, formato_descarga, titulo_original):
+def procesar_carpeta_final(carpeta_destino, titulo, formato_descarga, titulo_original, ya_extraido=False):
     """
-    1. Extrae RARs.
+    1. Extrae RARs (salvo que ya se hayan extraído en streaming).
     2. Busca video principal.
     3. Analiza video con MediaInfo (Codec y HDR).
     4. Renombra usando metadatos reales.
@@ -133,7 +228,9 @@ def procesar_carpeta_final(carpeta_destino, titulo, formato_descarga, titulo_ori
     # 1. BUSCAR Y EXTRAER RARS
     rars = [f for f in os.listdir(carpeta_destino) if f.lower().endswith('.rar')]
     
-    if rars:
+    if rars and ya_extraido:
+        print("      [UNRAR] Ya extraído durante la descarga.")
+    elif rars:
         rars.sort()
         rar_a_extraer = os.path.join(carpeta_destino, rars[0])
         print(f"      [UNRAR] Extrayendo: {rars[0]}...")
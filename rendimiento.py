@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import threading
+import config
+
+class TablaRendimiento:
+    """
+    Rendimiento medido por (host, debrid): velocidad media (EWMA), tasa de
+    fallos y tiempo hasta el primer byte. Se guarda en CONFIG_DIR y sirve
+    para ordenar los mirrors; PRIORIDAD_DOMINIOS queda como punto de partida
+    mientras no haya mediciones suficientes.
+    """
+    ALFA = 0.3          # Peso de la última medición en la media
+    PESO_PRIOR = 3.0    # Cuántas mediciones "vale" la prioridad estática
+    VIDA_MEDIA_DIAS = 7 # Las mediciones antiguas pierden peso frente al prior
+
+    def __init__(self, ruta):
+        self._lock = threading.Lock()
+        self.ruta = ruta
+        self._datos = None
+
+    def _cargar(self):
+        if self._datos is not None: return
+        self._datos = {}
+        try:
+            if os.path.exists(self.ruta):
+                with open(self.ruta, 'r', encoding='utf-8') as f:
+                    self._datos = json.load(f)
+        except Exception as e:
+            print(f"[RENDIMIENTO] No se pudo leer {self.ruta}: {e}")
+
+    def _guardar(self):
+        try:
+            with open(self.ruta + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump(self._datos, f, indent=1)
+            os.replace(self.ruta + ".tmp", self.ruta)
+        except Exception as e:
+            print(f"[RENDIMIENTO] No se pudo guardar {self.ruta}: {e}")
+
+    def _entrada(self, host, debrid):
+        clave = f"{host}|{debrid}"
+        if clave not in self._datos:
+            self._datos[clave] = {"mb_s": 0.0, "ttfb": 0.0, "fallos": 0.0, "muestras": 0, "intentos": 0, "actualizado": 0}
+        entrada = self._datos[clave]
+        # 'muestras' = mediciones de velocidad; 'intentos' = éxitos + fallos (tabla antigua: sin este campo)
+        entrada.setdefault("intentos", entrada["muestras"])
+        return entrada
+
+    def _mezclar(self, anterior, nuevo, n_previas):
+        """EWMA; la primera medición (n_previas == 0) se toma tal cual."""
+        if n_previas == 0: return nuevo
+        return self.ALFA * nuevo + (1 - self.ALFA) * anterior
+
+    def registrar_exito(self, host, debrid, mb_s, ttfb):
+        with self._lock:
+            self._cargar()
+            e = self._entrada(host, debrid)
+            e["mb_s"] = round(self._mezclar(e["mb_s"], mb_s, e["muestras"]), 3)
+            e["ttfb"] = round(self._mezclar(e["ttfb"], ttfb, e["muestras"]), 3)
+            e["fallos"] = round(self._mezclar(e["fallos"], 0.0, e["intentos"]), 3)
+            e["muestras"] += 1
+            e["intentos"] += 1
+            e["actualizado"] = time.time()
+            self._guardar()
+
+    def registrar_fallo(self, host, debrid):
+        with self._lock:
+            self._cargar()
+            e = self._entrada(host, debrid)
+            # Un fallo no es una medición de velocidad: mb_s/ttfb y 'muestras' no se tocan
+            e["fallos"] = round(self._mezclar(e["fallos"], 1.0, e["intentos"]), 3)
+            e["intentos"] += 1
+            e["actualizado"] = time.time()
+            self._guardar()
+
+    def coste(self, host, debrid, prioridad_estatica):
+        """
+        Segundos estimados para bajar 1 GB por este mirror (menor es mejor).
+        Sin mediciones, equivale al orden de PRIORIDAD_DOMINIOS.
+        """
+        rango = min(prioridad_estatica, len(config.PRIORIDAD_DOMINIOS))
+        prior_mb = config.RENDIMIENTO_MB_PRIOR / (1 + 0.25 * rango)
+
+        with self._lock:
+            self._cargar()
+            e = self._datos.get(f"{host}|{debrid}")
+            if e and e.get("intentos", e["muestras"]) > 0:
+                dias = (time.time() - e["actualizado"]) / 86400
+                olvido = 0.5 ** (dias / self.VIDA_MEDIA_DIAS)
+                peso_vel = e["muestras"] * olvido
+                peso_fallos = e.get("intentos", e["muestras"]) * olvido
+                medido_mb = e["mb_s"] if e["muestras"] > 0 and e["mb_s"] > 0 else prior_mb
+                mb_s = (peso_vel * medido_mb + self.PESO_PRIOR * prior_mb) / (peso_vel + self.PESO_PRIOR)
+                fallos = e["fallos"] * peso_fallos / (peso_fallos + self.PESO_PRIOR)
+                ttfb = e["ttfb"] if e["muestras"] > 0 else 0.0
+            else:
+                mb_s, fallos, ttfb = prior_mb, 0.0, 0.0
+
+        mb_s_efectivos = max(mb_s * (1 - fallos), 0.01)
+        return 1024 / mb_s_efectivos + ttfb
+
+tabla = TablaRendimiento(config.RENDIMIENTO_FILE)
@@ -1,13 +1,22 @@
 import time
 import re
 import random
-import requests
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html.parser import HTMLParser
 import config
 import database as db
+from sesion_http import obtener_sesion, nueva_sesion
+from sesion_foro import SesionForo
+from navegador import filtro
 from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 
 URL_BASE = "https://descargasdd.org"
 
+# Login guardado entre ciclos (main lo carga al crear el contexto)
+sesion = SesionForo(config.SESSION_FILE, URL_BASE)
+
 # --- SELECTORES (Navbar) ---
 SELECTOR_USER = "#navbar_username"
 SELECTOR_PASS_HINT = "#navbar_password_hint" 
@@ -19,6 +28,97 @@ SELECTOR_LOGOUT = "text=Finalizar sesión"
 def espera_humana():
     time.sleep(random.uniform(2.0, 4.0)) # Aumentamos un poco la espera
 
+class LimitadorCortesia:
+    """
+    Ritmo global de navegaciones al foro. Entre dos arranques pasa un
+    intervalo aleatorio (como espera_humana), pero se cuenta desde el
+    arranque anterior y no desde que terminó de cargar: varias pestañas
+    pueden estar cargando a la vez sin que suba la tasa que ve la web.
+    """
+    def __init__(self, minimo, maximo):
+        self._lock = threading.Lock()
+        self.minimo = minimo
+        self.maximo = maximo
+        self._siguiente = 0.0
+
+    def reservar(self):
+        """Reserva el siguiente turno y devuelve los segundos que faltan para él."""
+        with self._lock:
+            ahora = time.monotonic()
+            espera = max(0.0, self._siguiente - ahora)
+            self._siguiente = max(ahora, self._siguiente) + random.uniform(self.minimo, self.maximo)
+        return espera
+
+    def esperar(self):
+        espera = self.reservar()
+        if espera: time.sleep(espera)
+
+cortesia = LimitadorCortesia(config.SCRAPER_INTERVALO_MIN, config.SCRAPER_INTERVALO_MAX)
+
+class PoolPaginas:
+    """
+    Varias pestañas del mismo contexto (ya logueado) para leer hilos.
+    Playwright síncrono no se puede usar desde otros hilos, así que la
+    concurrencia es de red: cada navegación se lanza con wait_until="commit"
+    (vuelve en cuanto llegan las cabeceras), se pasa a la siguiente pestaña
+    y luego se recoge cada una en orden.
+    """
+    def __init__(self, context, tamano):
+        self.context = context
+        self.tamano = max(1, tamano)
+        self._paginas = []
+
+    def _contenido(self, page):
+        try:
+            page.wait_for_load_state("domcontentloaded", timeout=60000)
+            if "Just a moment" in page.title():
+                return RuntimeError("Bloqueo Cloudflare detectado")
+            return page.inner_html("div.postcontent", timeout=5000)
+        except Exception as e:
+            return e
+
+    def leer(self, urls, al_leer=None):
+        """
+        {url: html de div.postcontent o la excepción que impidió leerlo}.
+        al_leer(url, resultado), si se pasa, se llama con cada hilo en cuanto
+        se recoge, sin esperar al resto de la tanda.
+        """
+        resultados = {}
+        pendientes = deque(urls)
+        libres = list(self._paginas)
+        en_vuelo = deque()
+        while pendientes or en_vuelo:
+            while pendientes and (libres or len(self._paginas) < self.tamano):
+                if libres: page = libres.pop()
+                else:
+                    page = self.context.new_page()
+                    self._paginas.append(page)
+                url = pendientes.popleft()
+                # Nada de time.sleep: los handlers de route (navegador.filtro) solo
+                # corren dentro de llamadas a Playwright y las pestañas en vuelo
+                # se quedarían paradas durante la pausa
+                espera = cortesia.reservar()
+                if espera: page.wait_for_timeout(espera * 1000)
+                try:
+                    page.goto(url, wait_until="commit", timeout=60000)
+                    en_vuelo.append((page, url))
+                except Exception as e:
+                    resultados[url] = e
+                    libres.append(page)
+                    if al_leer: al_leer(url, e)
+            if en_vuelo:
+                page, url = en_vuelo.popleft()
+                resultados[url] = self._contenido(page)
+                libres.append(page)
+                if al_leer: al_leer(url, resultados[url])
+        return resultados
+
+    def cerrar(self):
+        for page in self._paginas:
+            try: page.close()
+            except: pass
+        self._paginas = []
+
 def analizar_titulo(titulo_hilo):
     titulo_hilo = titulo_hilo.replace(":", " ") 
     match_anio = re.search(r'\((\d{4})\)', titulo_hilo)
@@ -64,15 +164,20 @@ def obtener_cookies_flaresolverr():
     
     try:
         endpoint = f"{config.FLARESOLVERR_URL}/v1" if not config.FLARESOLVERR_URL.endswith("/v1") else config.FLARESOLVERR_URL
-        resp = requests.post(endpoint, headers=headers, json=data, timeout=70)
+        resp = obtener_sesion().post(endpoint, headers=headers, json=data, timeout=70)
         
         if resp.status_code == 200:
             res_json = resp.json()
             if res_json.get("status") == "ok":
                 print("   [FLARESOLVERR] ¡Desafío resuelto exitosamente!")
                 fs_cookies = res_json["solution"]["cookies"]
-                # Convertir formato
-                return [{"name": c["name"], "value": c["value"], "domain": c["domain"], "path": c["path"]} for c in fs_cookies]
+                # Convertir formato (conservando la caducidad para saber cuándo renovar cf_clearance)
+                cookies = []
+                for c in fs_cookies:
+                    cookie = {"name": c["name"], "value": c["value"], "domain": c["domain"], "path": c["path"]}
+                    if c.get("expiry"): cookie["expires"] = float(c["expiry"])
+                    cookies.append(cookie)
+                return cookies
             else:
                 print(f"   [FLARESOLVERR] Fallo en respuesta: {res_json.get('message')}")
         else:
@@ -84,6 +189,107 @@ def obtener_cookies_flaresolverr():
     
     return None
 
+# --- LECTURA DE HILOS POR HTTP ---
+
+class _ExtractorPostcontent(HTMLParser):
+    """HTML interior del primer div.postcontent (lo mismo que page.inner_html)."""
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.partes = []
+        self._profundidad = 0
+        self.encontrado = False
+        self.terminado = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.terminado: return
+        if self._profundidad:
+            self.partes.append(self.get_starttag_text())
+            if tag == "div": self._profundidad += 1
+        elif tag == "div" and "postcontent" in (dict(attrs).get("class") or "").split():
+            self._profundidad = 1
+            self.encontrado = True
+
+    def handle_startendtag(self, tag, attrs):
+        if self._profundidad and not self.terminado: self.partes.append(self.get_starttag_text())
+
+    def handle_endtag(self, tag):
+        if not self._profundidad or self.terminado: return
+        if tag == "div":
+            self._profundidad -= 1
+            if not self._profundidad:
+                self.terminado = True
+                return
+        self.partes.append(f"</{tag}>")
+
+    def handle_data(self, data):
+        if self._profundidad and not self.terminado: self.partes.append(data)
+
+    def handle_entityref(self, name):
+        self.handle_data(f"&{name};")
+
+    def handle_charref(self, name):
+        self.handle_data(f"&#{name};")
+
+def extraer_postcontent(html):
+    parser = _ExtractorPostcontent()
+    parser.feed(html)
+    return "".join(parser.partes) if parser.encontrado else None
+
+def es_desafio_cloudflare(resp):
+    if resp.status_code not in (403, 429, 503): return False
+    return "cf-mitigated" in resp.headers or "Just a moment" in resp.text or "challenge-platform" in resp.text
+
+class LectorHttp:
+    """
+    Lee los hilos con peticiones HTTP normales usando las cookies del
+    contexto de Playwright (sesión del foro + cf_clearance de FlareSolverr)
+    y el mismo User-Agent. Solo los que devuelven un desafío de Cloudflare
+    o una página sin div.postcontent se reintentan con Chromium (respaldo).
+    """
+    def __init__(self, context, respaldo):
+        self.context = context
+        self.respaldo = respaldo
+        # Sin reintentos por estado: un 429/503 es un desafío o un aviso del foro
+        # y debe llegar a es_desafio_cloudflare, con el ritmo que marque cortesia
+        self.sesion = nueva_sesion(reintentar_estados=False)
+        self.sesion.headers["Accept-Language"] = "es-ES,es;q=0.9"
+
+    def _copiar_cookies(self):
+        # context.cookies() solo se puede llamar desde el hilo de Playwright
+        for c in self.context.cookies(URL_BASE):
+            self.sesion.cookies.set(c["name"], c["value"], domain=c["domain"], path=c["path"])
+
+    def _leer_uno(self, url):
+        cortesia.esperar()
+        try:
+            resp = self.sesion.get(url, timeout=30, headers={"Referer": f"{URL_BASE}/"})
+            if es_desafio_cloudflare(resp): return None
+            if resp.status_code != 200: return RuntimeError(f"HTTP {resp.status_code}")
+            return extraer_postcontent(resp.text)
+        except Exception as e:
+            return e
+
+    def leer(self, urls, al_leer=None):
+        """
+        Mismo contrato que PoolPaginas.leer. al_leer se llama desde este hilo
+        (el de Playwright) según van terminando las peticiones.
+        """
+        if not urls: return {}
+        self._copiar_cookies()
+        resultados = {}
+        with ThreadPoolExecutor(max_workers=config.SCRAPER_PAGINAS) as executor:
+            futuros = {executor.submit(self._leer_uno, url): url for url in urls}
+            for futuro in as_completed(futuros):
+                url = futuros[futuro]
+                resultados[url] = futuro.result()
+                if al_leer and resultados[url] is not None: al_leer(url, resultados[url])
+
+        a_chromium = [url for url in urls if resultados[url] is None]
+        if a_chromium:
+            print(f"      [HTTP] {len(a_chromium)} hilos con desafío o sin contenido. Reintentando con el navegador...")
+            resultados.update(self.respaldo.leer(a_chromium, al_leer))
+        return resultados
+
 # --- LOGIN ---
 
 def realizar_login(page):
@@ -143,127 +349,223 @@ def realizar_login(page):
 
 # --- REPARACIÓN Y PROCESADO ---
 
-def reparar_hilos_rotos(page):
-    rotas = db.obtener_descargas_sin_enlaces()
+def reparar_hilos_rotos(lector):
+    rotas = [(item[0], item[1] or "Sin titulo") for item in db.obtener_descargas_sin_enlaces()
+             if item[0] and item[0] != '0']
     if not rotas: return
 
     print(f"\n   [REPARACIÓN] Detectadas {len(rotas)} descargas rotas. Reparando...")
-    for item in rotas:
-        hilo_id = item[0]
-        titulo = item[1] or "Sin titulo"
-        if not hilo_id or hilo_id == '0': continue
-        url_hilo = f"{URL_BASE}/showthread.php?t={hilo_id}"
+    for hilo_id, titulo in rotas:
         print(f"      [REPARAR] {hilo_id}: {titulo[:20]}...")
-        try:
-            page.goto(url_hilo, wait_until="domcontentloaded", timeout=60000)
-            
-            # Chequeo Cloudflare también aquí
-            if "Just a moment" in page.title():
-                print("      [SKIP] Bloqueo Cloudflare detectado.")
-                continue
+    resultados = lector.leer([f"{URL_BASE}/showthread.php?t={hilo_id}" for hilo_id, _ in rotas])
 
-            try: content_html = page.inner_html("div.postcontent", timeout=5000)
-            except: content_html = page.content()
-            
+    with db.conexion() as conn:
+        cur = conn.cursor()
+        for hilo_id, titulo in rotas:
+            content_html = resultados[f"{URL_BASE}/showthread.php?t={hilo_id}"]
+            if isinstance(content_html, Exception):
+                print(f"      [ERROR] Reparación fallida ({hilo_id}): {content_html}")
+                continue
             enlaces = extraer_enlaces_post(content_html)
             if enlaces:
-                str_enlaces = "\n".join(enlaces)
-                conn = db.get_connection(); cur = conn.cursor()
-                db.actualizar_enlaces(conn, cur, hilo_id, str_enlaces)
-                cur.close(); conn.close()
-                print(f"      [OK] Recuperados {len(enlaces)} enlaces.")
+                db.actualizar_enlaces(conn, cur, hilo_id, enlaces)
+                print(f"      [OK] {hilo_id}: recuperados {len(enlaces)} enlaces.")
             else:
-                print(f"      [FAIL] Sin enlaces. Debug guardado.")
-                page.screenshot(path=f"{config.LOG_DIR}/debug_repair_fail_{hilo_id}.png")
-            espera_humana()
-        except Exception as e:
-            print(f"      [ERROR] Reparación fallida: {e}")
+                print(f"      [FAIL] {hilo_id}: sin enlaces. Debug guardado.")
+                try:
+                    with open(f"{config.LOG_DIR}/debug_repair_fail_{hilo_id}.html", 'w', encoding='utf-8') as f:
+                        f.write(content_html)
+                except: pass
+        cur.close()
 
-def procesar_hilo(page, url_hilo, titulo_raw, foro_id):
-    try:
+def id_hilo(url_hilo):
+    match_id = re.search(r't=(\d+)', url_hilo)
+    return int(match_id.group(1)) if match_id else 0
+
+def procesar_hilos(lector, foro_id, candidatos, al_encontrar=None):
+    """
+    Procesa una tanda de hilos [(url, titulo)]: una consulta para saber
+    cuáles ya tenemos y se visitan solo los que faltan. Lo leído se guarda
+    por lotes (cada SCRAPER_LOTE_HILOS hilos o SCRAPER_LOTE_SEGUNDOS, y al
+    final) con db.guardar_hilos, y tras cada lote se llama a al_encontrar,
+    así que las descargas empiezan sin esperar a toda la página.
+    Devuelve los ids de los hilos que no se pudieron guardar.
+    """
+    hilos = []
+    for url_hilo, titulo_raw in candidatos:
+        if any(palabra in titulo_raw.upper() for palabra in config.PALABRAS_EXCLUIDAS): continue
         titulo_base, anio, formato = analizar_titulo(titulo_raw)
-        for palabra in config.PALABRAS_EXCLUIDAS:
-            if palabra in titulo_raw.upper(): return
+        hilos.append({
+            "url": url_hilo, "hilo_id": str(id_hilo(url_hilo)),
+            "titulo_base": titulo_base, "formato": formato, "titulo_raw": titulo_raw, "enlaces": []
+        })
+    if not hilos: return []
 
-        conn = db.get_connection(); cur = conn.cursor()
-        match_id = re.search(r't=(\d+)', url_hilo)
-        hilo_id = match_id.group(1) if match_id else "0"
-        
-        descarga_existente = db.buscar_descarga(cur, hilo_id)
-        if descarga_existente and descarga_existente[0] and len(descarga_existente[0]) > 10:
-            cur.close(); conn.close(); return
-
-        meta = db.buscar_pelicula_meta(cur, titulo_base)
-        if meta: peli_id = meta[0]
-        else: peli_id = db.insertar_pelicula_meta(conn, cur, titulo_base)
-
-        print(f"      [NUEVO] {titulo_base}")
-        page.goto(url_hilo, wait_until="domcontentloaded")
-        content_html = page.inner_html("div.postcontent", timeout=5000)
-        enlaces = extraer_enlaces_post(content_html)
-        
-        if enlaces:
-            str_enlaces = "\n".join(enlaces)
-            if descarga_existente: db.actualizar_enlaces(conn, cur, hilo_id, str_enlaces)
-            else:
-                db.insertar_descarga_hueco(conn, cur, peli_id, foro_id, hilo_id, formato, titulo_raw)
-                db.actualizar_enlaces(conn, cur, hilo_id, str_enlaces)
+    with db.conexion() as conn:
+        cur = conn.cursor()
+        existentes = db.buscar_descargas(cur, [h["hilo_id"] for h in hilos])
+        cur.close()
+
+    a_visitar = {h["url"]: h for h in hilos if not existentes.get(h["hilo_id"])}  # Sin enlaces vivos
+    for h in a_visitar.values(): print(f"      [NUEVO] {h['titulo_base']}")
+    fallidos, lote = [], []
+    ultimo_volcado = time.monotonic()
+
+    def volcar():
+        nonlocal ultimo_volcado
+        ultimo_volcado = time.monotonic()
+        if not lote: return
+        # Conexión solo mientras se guarda: la lectura (a ritmo de cortesia) no la retiene
+        with db.conexion() as conn:
+            cur = conn.cursor()
+            con_enlaces = db.guardar_hilos(conn, cur, foro_id, lote)
+            cur.close()
+        if con_enlaces is None:
+            fallidos.extend(int(h["hilo_id"]) for h in lote)
+        elif al_encontrar:
+            for peli_id in con_enlaces: al_encontrar(peli_id)
+        lote.clear()
+
+    def al_leer(url, content_html):
+        h = a_visitar[url]
+        if isinstance(content_html, Exception):
+            print(f"      [ERROR] Hilo {h['hilo_id']}: {content_html}")
+            fallidos.append(int(h["hilo_id"]))
         else:
-            if not descarga_existente:
-                db.insertar_descarga_hueco(conn, cur, peli_id, foro_id, hilo_id, formato, titulo_raw)
-        cur.close(); conn.close(); espera_humana()
-    except: pass
+            h["enlaces"] = extraer_enlaces_post(content_html)
+            lote.append(h)
+        if len(lote) >= config.SCRAPER_LOTE_HILOS or time.monotonic() - ultimo_volcado >= config.SCRAPER_LOTE_SEGUNDOS:
+            volcar()
+
+    lector.leer(list(a_visitar), al_leer)
+    volcar()
+    return fallidos
 
-def procesar_foro(page, foro_id):
+# Un solo viaje al navegador para toda la lista (cada llamada de Playwright es un round trip)
+JS_LISTAR_HILOS = """
+(hilos) => hilos.map(li => {
+    const a = li.querySelector("a.title");
+    return {
+        titulo: a ? a.innerText.trim() : "",
+        href: a ? a.getAttribute("href") : null,
+        visible: li.getClientRects().length > 0 && getComputedStyle(li).visibility !== "hidden",
+        fijo: li.classList.contains("sticky") || /adh?i?erido/i.test(li.innerText.slice(0, 200))
+    };
+})
+"""
+
+def listar_hilos(page, foro_id, pagina=1):
+    """[(url, titulo)] de una página del foro, por fecha de creación (los más nuevos arriba)."""
+    cortesia.esperar()
+    page.goto(f"{URL_BASE}/forumdisplay.php?f={foro_id}&sort=dateline&order=desc&page={pagina}",
+              wait_until="domcontentloaded")
+    filas = page.eval_on_selector_all("li.threadbit", JS_LISTAR_HILOS)
+    candidatos = []
+    for fila in filas:
+        if not fila["visible"] or not fila["href"] or not fila["titulo"]: continue
+        if fila["fijo"] or "adhierido" in fila["titulo"].lower(): continue
+        candidatos.append((f"{URL_BASE}/{fila['href']}", fila["titulo"]))
+    return candidatos
+
+def procesar_foro(page, lector, foro_id, al_encontrar=None):
+    """
+    Escaneo incremental: se guarda en la DB el hilo_id más alto ya procesado
+    y la lista se recorre solo hasta el primer hilo conocido. Se pasa a la
+    página siguiente únicamente si toda la página era nueva y traía más de
+    FORO_PAGINAR_SI_NUEVOS hilos. En régimen normal: una carga por foro.
+    """
     print(f"   [SCRAPER] Escaneando Foro {foro_id}...")
     try:
-        page.goto(f"{URL_BASE}/forumdisplay.php?f={foro_id}&order=desc", wait_until="domcontentloaded")
-        hilos = page.locator("li.threadbit").all()
-        count = 0
-        for hilo in hilos:
-            if count >= 10: break
-            try:
-                if not hilo.is_visible(): continue
-                el = hilo.locator("a.title")
-                if el.count() == 0: continue
-                txt = el.inner_text().strip()
-                if "adhierido" in txt.lower(): continue
-                href = el.get_attribute("href")
-                procesar_hilo(page, f"{URL_BASE}/{href}", txt, foro_id)
-                count += 1
-            except: continue
+        with db.conexion() as conn:
+            cur = conn.cursor()
+            marca = db.obtener_marca_foro(cur, foro_id)
+            cur.close()
+
+        nuevos = []
+        for pagina in range(1, config.FORO_MAX_PAGINAS + 1):
+            candidatos = listar_hilos(page, foro_id, pagina)
+            if marca is None:
+                # Primera vez: como antes, solo los primeros de la primera página
+                nuevos = candidatos[:config.FORO_HILOS_PRIMERA_VEZ]
+                break
+            nuevos_pagina = [c for c in candidatos if id_hilo(c[0]) > marca]
+            nuevos.extend(nuevos_pagina)
+            if len(nuevos_pagina) < len(candidatos): break  # Llegamos a un hilo conocido
+            if len(nuevos_pagina) <= config.FORO_PAGINAR_SI_NUEVOS: break
+
+        if not nuevos:
+            print(f"      [SCRAPER] Sin hilos nuevos (marca {marca}).")
+            return
+
+        fallidos = procesar_hilos(lector, foro_id, nuevos, al_encontrar)
+        ids = [id_hilo(url) for url, _ in nuevos]
+
+        with db.conexion() as conn:
+            cur = conn.cursor()
+            seguidos = db.registrar_fallos_hilos(conn, cur, foro_id, fallidos, set(ids) - set(fallidos))
+
+            # La marca no puede pasar de un hilo que falló (el siguiente ciclo lo
+            # reintenta), salvo que ya lleve FORO_MAX_FALLOS_HILO fallos seguidos
+            bloquean = [h for h in fallidos if seguidos.get(h, 0) < config.FORO_MAX_FALLOS_HILO]
+            for h in sorted(set(fallidos) - set(bloquean)):
+                print(f"      [SCRAPER] Hilo {h} falla {seguidos[h]} ciclos seguidos. Se abandona.")
+            nueva_marca = min(bloquean) - 1 if bloquean else max(ids)
+            if nueva_marca > (marca or 0):
+                db.guardar_marca_foro(conn, cur, foro_id, nueva_marca)
+            cur.close()
     except Exception as e:
         print(f"   [!] Error foro {foro_id}: {e}")
 
 # --- EJECUCIÓN ---
 
-def ejecutar(context):
-    
-    # 1. OBTENER COOKIES DE FLARESOLVERR (INTENTO DE BYPASS)
-    cookies_flare = obtener_cookies_flaresolverr()
-    if cookies_flare:
-        print(f"   [FLARESOLVERR] Inyectando {len(cookies_flare)} cookies...")
-        context.add_cookies(cookies_flare)
-    else:
-        print("   [WARN] No se pudieron obtener cookies de FlareSolverr. Intentando directo...")
+def ejecutar(context, al_encontrar=None):
+    """
+    al_encontrar(pelicula_id): se llama en cuanto un hilo nuevo queda guardado
+    con enlaces, para que la descarga empiece sin esperar al final del scraping.
+    """
     
     page = context.new_page()
+    paginas = PoolPaginas(context, config.SCRAPER_PAGINAS)
     try:
-        # 2. LOGIN
-        if not realizar_login(page):
-            print("   [SCRAPER] ABORTANDO: Fallo login / Cloudflare.")
-            page.close()
-            return 
+        # 1. ¿SIGUE VALIENDO LA SESIÓN GUARDADA? (una petición, sin renderizar)
+        if sesion.estado_guardado() and sesion.es_valida(context):
+            print("   [SESIÓN] ✅ Sesión guardada válida. Sin login.")
+        else:
+            # 2. COOKIES DE FLARESOLVERR (solo si no hay un cf_clearance vigente)
+            if sesion.cf_clearance_vigente(context):
+                print("   [FLARESOLVERR] cf_clearance aún vigente. Se reutiliza.")
+            else:
+                cookies_flare = obtener_cookies_flaresolverr()
+                if cookies_flare:
+                    print(f"   [FLARESOLVERR] Inyectando {len(cookies_flare)} cookies...")
+                    context.add_cookies(cookies_flare)
+                else:
+                    print("   [WARN] No se pudieron obtener cookies de FlareSolverr. Intentando directo...")
 
-        reparar_hilos_rotos(page)
+            # 3. LOGIN (filtro relajado: el formulario necesita sus scripts y estilos)
+            with filtro.modo_relajado():
+                login_ok = realizar_login(page)
+            if not login_ok:
+                print("   [SCRAPER] ABORTANDO: Fallo login / Cloudflare.")
+                sesion.borrar()
+                return
+            sesion.guardar(context)
+
+        # Tras el login los hilos se leen por HTTP; Chromium queda de respaldo
+        lector = LectorHttp(context, paginas) if config.SCRAPER_HTTP else paginas
+
+        # Las esperas entre peticiones las pone 'cortesia', no hace falta dormir aquí
+        reparar_hilos_rotos(lector)
 
         if hasattr(config, 'FOROS_PROCESAR'):
             for fid in config.FOROS_PROCESAR:
-                procesar_foro(page, fid)
-                espera_humana()
+                procesar_foro(page, lector, fid, al_encontrar)
                 
     except Exception as e:
         print(f"   [!] Error Scraper: {e}")
     finally:
+        paginas.cerrar()
         try: page.close()
-        except: pass
\ No newline at end of file
+        except: pass
+    # Cookies renovadas durante el scraping (cf_clearance, sesión del foro)
+    sesion.guardar(context)
\ No newline at end of file
@@ -0,0 +1,53 @@
+import os
+import time
+
+class SesionForo:
+    """
+    Sesión del foro guardada entre ciclos (storage_state de Playwright:
+    cookies + localStorage). Antes de hacer login se comprueba con una sola
+    petición HTTP si sigue siendo válida; FlareSolverr solo se llama si no
+    hay un cf_clearance vigente.
+    """
+    MARGEN_SEGUNDOS = 300  # cf_clearance que caduca en menos de esto se renueva ya
+
+    def __init__(self, ruta, url_base):
+        self.ruta = ruta
+        self.url_base = url_base
+
+    def estado_guardado(self):
+        """Ruta del storage_state si existe (para browser.new_context(storage_state=...))."""
+        return self.ruta if os.path.exists(self.ruta) else None
+
+    def guardar(self, context):
+        try:
+            context.storage_state(path=self.ruta + ".tmp")
+            os.chmod(self.ruta + ".tmp", 0o600)  # Contiene las cookies de sesión
+            os.replace(self.ruta + ".tmp", self.ruta)
+        except Exception as e:
+            print(f"   [SESIÓN] No se pudo guardar la sesión: {e}")
+
+    def borrar(self):
+        try: os.remove(self.ruta)
+        except FileNotFoundError: pass
+
+    def cf_clearance_vigente(self, context):
+        for c in context.cookies(self.url_base):
+            if c["name"] != "cf_clearance": continue
+            # expires = -1 (sin caducidad conocida): mejor pedir uno nuevo
+            if c.get("expires", -1) > time.time() + self.MARGEN_SEGUNDOS:
+                return True
+        return False
+
+    def es_valida(self, context):
+        """
+        Una petición sin renderizar (context.request comparte las cookies del
+        contexto). Logueado = la página trae el enlace de cerrar sesión.
+        """
+        try:
+            resp = context.request.get(f"{self.url_base}/usercp.php", timeout=20000)
+            if resp.status != 200: return False
+            html = resp.text()
+            return "do=logout" in html or "Finalizar sesión" in html
+        except Exception as e:
+            print(f"   [SESIÓN] Sondeo fallido: {e}")
+            return False
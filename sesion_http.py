@@ -0,0 +1,55 @@
+import threading
+import requests
+import config
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_lock = threading.Lock()
+_sesion = None
+
+def _crear_sesion(reintentar_estados=True):
+    reintentos = Retry(
+        total=config.HTTP_REINTENTOS,
+        backoff_factor=config.HTTP_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504) if reintentar_estados else (),
+        # Métodos por defecto (GET, HEAD...): un POST solo se reintenta si falla
+        # al conectar. FlareSolverr responde 500 cuando no resuelve (cada intento
+        # hasta 60 s) y downloader/add de Debrid-Link no es idempotente
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        respect_retry_after_header=True,
+        # Si se agotan, devolvemos la última respuesta (los llamadores miran status_code)
+        raise_on_status=False
+    )
+    # pool_block=True: si un host ya tiene todas sus conexiones ocupadas,
+    # la petición espera turno en vez de abrir una conexión extra.
+    adaptador = HTTPAdapter(
+        pool_connections=config.HTTP_POOL_HOSTS,
+        pool_maxsize=config.HTTP_POOL_POR_HOST,
+        pool_block=True,
+        max_retries=reintentos
+    )
+    sesion = requests.Session()
+    sesion.mount("https://", adaptador)
+    sesion.mount("http://", adaptador)
+    sesion.headers["User-Agent"] = config.DEFAULT_USER_AGENT
+    return sesion
+
+def obtener_sesion():
+    """
+    Sesión HTTP compartida por todos los hilos (API debrid, FlareSolverr y
+    descargas). Reutiliza conexiones keep-alive, así que cada llamada no paga
+    DNS + TCP + TLS de nuevo.
+    """
+    global _sesion
+    with _lock:
+        if _sesion is None:
+            _sesion = _crear_sesion()
+        return _sesion
+
+def nueva_sesion(reintentar_estados=True):
+    """
+    Sesión con la misma configuración de pool y reintentos pero cookies propias.
+    reintentar_estados=False: solo se reintentan errores de conexión; un 429 o
+    503 vuelve al llamador tal cual (el foro los usa para sus desafíos).
+    """
+    return _crear_sesion(reintentar_estados)
@@ -1,7 +1,5 @@
 import re
 import os
-import config
-from datetime import datetime
 
 def sanitizar_nombre(nombre):
     """
@@ -33,22 +31,3 @@ def formatear_tamano(size_in_mb):
     if size_in_mb >= 1024:
         return f"{size_in_mb/1024:.2f} GB"
     return f"{size_in_mb:.1f} MB"
-
-def debe_aplicar_limite():
-    """
-    Comprueba si la hora actual está dentro del rango definido en config
-    para aplicar el límite de velocidad.
-    """
-    if not config.ENABLE_SPEED_LIMIT:
-        return False
-        
-    now = datetime.now().time()
-    start = config.LIMIT_START_TIME
-    end = config.LIMIT_END_TIME
-    
-    # Caso 1: Rango en el mismo día (Ej: 08:00 a 20:00)
-    if start < end:
-        return start <= now <= end
-    # Caso 2: Rango cruza la medianoche (Ej: 22:00 a 08:00)
-    else:
-        return now >= start or now <= end
\ No newline at end of file
@@ -3,6 +3,7 @@ import json
 import mimetypes
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from monitor import state
+from horario import horario
 import config
 
 # Definimos rutas base
@@ -47,6 +48,14 @@ class RequestHandler(BaseHTTPRequestHandler):
             self.wfile.write(json.dumps(data).encode('utf-8'))
             return
 
+        # 2b. Horario semanal de ancho de banda
+        if self.path == '/api/settings/schedule':
+            self.send_response(200)
+            self.send_header('Content-type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps(horario.obtener_reglas()).encode('utf-8'))
+            return
+
         # 3. Servir el Dashboard (HTML)
         elif self.path == '/' or self.path == '/index.html':
             self.send_response(200)
@@ -82,6 +91,25 @@ class RequestHandler(BaseHTTPRequestHandler):
                 max_p = data.get('max_parallel', 1)
                 state.set_max_parallel(max_p)
                 self.send_response(200)
+
+            elif self.path == '/api/priority':
+                # Empujón manual desde el dashboard: {"titulo": "...", "delta": 1}
+                state.bump_priority(data['titulo'], data.get('delta', 1))
+                self.send_response(200)
+
+            elif self.path == '/api/settings/schedule':
+                # Lista de reglas: {"dias": [0..6], "inicio": "HH:MM", "fin": "HH:MM", "limite_mb": x|null, "max_paralelo": n|null}
+                # Mismo formato que devuelve el GET (la lista tal cual); también {"reglas": [...]}.
+                # Sin reglas es un 400: [] vacía el horario solo si se envía explícitamente
+                try:
+                    reglas = data.get('reglas') if isinstance(data, dict) else data
+                    if not isinstance(reglas, list):
+                        raise ValueError("se esperaba una lista de reglas")
+                    horario.guardar_reglas(reglas)
+                    self.send_response(200)
+                except (ValueError, KeyError, TypeError) as e:
+                    print(f"Horario no válido: {e}")
+                    self.send_response(400)
             
             else:
                 self.send_response(404)